@@ -1,36 +1,80 @@
-from kivymd.app import MDApp
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
-import os
 from kivy.clock import Clock
-from kivy.graphics.texture import Texture
 from kivy.uix.image import Image
 from kivy.uix.screenmanager import Screen
 from kivy.uix.boxlayout import BoxLayout
 from kivymd.uix.label import MDLabel
-from kivymd.uix.button import MDRaisedButton
+from kivymd.uix.button import MDRaisedButton, MDFlatButton
+from kivymd.uix.dialog import MDDialog
 from kivymd.uix.textfield import MDTextField
-from insightface.app import FaceAnalysis  # ✅ Use ArcFace
+from kivymd.app import MDApp
 from ManageFace import save_face_data
-
-# # Initialize ArcFace model
-# face_model = FaceAnalysis(name='buffalo_s')
-# face_model.prepare(ctx_id=-1)
+from utils.frame_pipeline import FramePipeline
+from utils.display_sink import DisplaySink
+from utils import face_images
+from utils.face_dedup import find_similar
+from utils.face_gallery import shared_gallery
+from utils.face_quality import assess, BestSamples
+from utils.face_templates import select_templates
+from utils.face_model import when_model_ready, load_model_async, detect_faces, analyze_faces, PREVIEW_DET_SIZE
+from utils.perf_metrics import metrics, timed
+from utils.perf_overlay import add_perf_overlay
 
 # Constants
-CAPTURE_LIMIT = 20  # Number of face images to capture
+CAPTURE_LIMIT = 20  # Best samples kept during capture (fixed-size heap)
+GOOD_SAMPLES = 8  # Capture ends once this many high-quality samples are kept
+GOOD_QUALITY = 0.5  # Sample score (see utils.face_quality.assess) counted as high quality
+MAX_CAPTURE_FRAMES = 90  # Give up waiting for good samples after this many frames
+
+# Enrollments are saved one at a time off the UI thread
+_save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="enroll")
+
+
+def check_duplicates(features):
+    """Enrolled people resembling the captured faces (runs on the enrollment worker)"""
+    with metrics.timer("add_face.duplicate_check"):
+        return find_similar(shared_gallery(), np.mean(features, axis=0))
+
+
+def save_enrollment(name, relation, features, best_crop, progress=None):
+    """Average the captures, save the best crop and insert the face record.
+
+    Runs on the enrollment worker; progress(text) reports each step.
+    Returns the new face id.
+    """
+    report = progress or (lambda text: None)
+    with metrics.timer("add_face.save"):
+        report(f"Saving {name}: computing features...")
+        # 计算平均特征
+        avg_features = np.mean(features, axis=0).astype(np.float32)
+        # 保留最多样的几帧作为额外模板（姿态/光照变化）
+        templates = select_templates(features)
+
+        # 捕捉时已裁剪并评分，直接保存最佳人脸（无需重新检测）
+        report(f"Saving {name}: writing image...")
+        image_path = face_images.save_face_image(best_crop)
+
+        # 保存到数据库
+        report(f"Saving {name}: updating database...")
+        return save_face_data(name, relation, image_path, avg_features, templates)
 
 
 class AddFaceScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.face_model = MDApp.get_running_app().face_model
+        self.face_model = None  # Shared ArcFace model, set once loaded
 
-        self.capture = None  # Camera instance
+        self.pipeline = None  # Capture -> inference pipeline
         self.clock_event = None  # Clock event
-        self.captured_features = []  # List of face embeddings
-        self.captured_images = []  # List of face images
-        self.capture_count = 0  # Track number of captures
+        self.rendered_id = 0  # Frame id of the last rendered result
+        self.capture_samples = None  # Queue of scored samples from the inference thread while capturing
+        self.samples = BestSamples(CAPTURE_LIMIT)  # Best embeddings and crop so far
+        self.frames_seen = 0  # Capture frames scored so far
+        self.rejected = 0  # Capture frames rejected by the quality gate
 
         # User input fields
         self.name_input = MDTextField(hint_text="Enter Name", multiline=False)
@@ -38,8 +82,9 @@ class AddFaceScreen(Screen):
 
         # UI Components
         self.layout = BoxLayout(orientation="vertical")
-        self.info_label = MDLabel(text="Enter details and start capture.", halign="center")
+        self.info_label = MDLabel(text="Loading face model...", halign="center")
         self.image = Image(allow_stretch=True, keep_ratio=True)
+        self.display = DisplaySink(self.image)  # Reusable texture upload
         self.capture_button = MDRaisedButton(text="Start Capture", on_release=self.start_capture, disabled=True)
 
         # Add components to layout
@@ -48,6 +93,7 @@ class AddFaceScreen(Screen):
         self.layout.add_widget(self.image)
         self.layout.add_widget(self.info_label)
         self.layout.add_widget(self.capture_button)
+        add_perf_overlay(self.layout, ("add_face", "db"))
         self.add_widget(self.layout)
 
         # 降低更新频率
@@ -55,9 +101,17 @@ class AddFaceScreen(Screen):
         # 添加状态标志
         self.is_capturing = False
 
+        when_model_ready(lambda model: Clock.schedule_once(lambda dt: self.on_model_ready(model)))
+
+    def on_model_ready(self, model):
+        """ Enable face detection once the shared model has loaded """
+        self.face_model = model
+        self.info_label.text = "Enter details and start capture."
+
     def on_enter(self, *args):
         """ Start camera when entering the screen """
-        if not self.capture or not self.capture.isOpened():
+        load_model_async()  # Not preloaded when recognition runs on a server
+        if not self.pipeline or not self.pipeline.isOpened():
             self.start_camera()
 
     def on_leave(self, *args):
@@ -67,37 +121,74 @@ class AddFaceScreen(Screen):
 
     def start_camera(self):
         """ Open camera and start face detection """
-        self.capture = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-        self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        self.capture.set(cv2.CAP_PROP_FPS, 15)  # 限制摄像头帧率
+        camera = cv2.VideoCapture(0, cv2.CAP_DSHOW)
+        camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        camera.set(cv2.CAP_PROP_FPS, 15)  # 限制摄像头帧率
 
-        if not self.capture.isOpened():
+        self.pipeline = FramePipeline(camera, self.process_frame, name="add_face")
+        if not self.pipeline.isOpened():
+            self.pipeline.stop()
+            self.pipeline = None
             self.info_label.text = "Error: Unable to access camera"
             return
 
+        self.rendered_id = 0
+        self.pipeline.start()
         self.clock_event = Clock.schedule_interval(self.update_frame, self.frame_interval)
 
     def stop_camera(self):
         """ Properly release the camera """
-        if self.capture:
-            self.capture.release()
-            self.capture = None
+        if self.is_capturing:
+            self.end_capture()
         if self.clock_event:
             self.clock_event.cancel()
+            self.clock_event = None
+        if self.pipeline:
+            self.pipeline.stop()
+            self.pipeline = None
+
+    def process_frame(self, frame):
+        """ Run face detection on the inference worker thread.
+
+        While capturing, every scored sample is also queued for capture_face,
+        so none is lost when the UI renders only the newest result.
+        """
+        if self.face_model is None:
+            return frame, None  # 模型加载中，仅显示画面
+
+        samples = self.capture_samples
+        if samples is not None:
+            # 捕捉时使用全分辨率提取特征（仅检测+识别），并在推理线程上评估质量
+            with metrics.timer("add_face.capture_analyze"):
+                faces = analyze_faces(self.face_model, frame)
+            if not faces:
+                samples.put((0.0, None, None, "no face"))
+                return frame, faces
+            face = max(faces, key=lambda f: f.det_score)
+            with metrics.timer("add_face.quality"):
+                score, crop, reason = assess(frame, face.bbox, face.kps, face.det_score)
+            samples.put((score, face.normed_embedding, crop, reason))
+            return frame, faces
+
+        # 预览只运行低分辨率检测，只需判断是否有人脸
+        with metrics.timer("add_face.preview_detect"):
+            bboxes, _ = detect_faces(self.face_model, frame, input_size=PREVIEW_DET_SIZE)
+        return frame, list(bboxes)
 
     def update_frame(self, dt):
-        """ Detect faces and enable capture button """
-        ret, frame = self.capture.read()
-        if not ret:
+        """ Render the newest frame and enable capture button """
+        result_id, result = self.pipeline.latest()
+        if result is None or result_id == self.rendered_id:
             return
-            
-        # 降低处理分辨率
-        frame = cv2.resize(frame, (320, 240))
-        
+        self.rendered_id = result_id
+        frame, faces = result
+
         # 只在非捕捉状态检测人脸
-        if not self.is_capturing:
-            faces = self.face_model.get(frame)
+        if faces is None:
+            self.capture_button.disabled = True
+            self.info_label.text = "Loading face model..."
+        elif not self.is_capturing:
             if faces:
                 self.capture_button.disabled = False
                 self.info_label.text = "Face detected! Press 'Start Capture' to begin"
@@ -105,12 +196,10 @@ class AddFaceScreen(Screen):
                 self.capture_button.disabled = True
                 self.info_label.text = "No face detected"
 
-        # 转换并显示图像
-        display_frame = cv2.resize(frame, (640, 480))  # 显示时放大
-        buf = cv2.flip(display_frame, 0).tobytes()
-        texture = Texture.create(size=(display_frame.shape[1], display_frame.shape[0]), colorfmt='bgr')
-        texture.blit_buffer(buf, colorfmt='bgr', bufferfmt='ubyte')
-        self.image.texture = texture
+        # 显示图像（由Image控件在GPU上缩放）
+        with metrics.timer("add_face.render"):
+            self.display.show(frame)
+        metrics.tick("add_face.render_fps")
 
     def start_capture(self, instance):
         """ Start the capture process """
@@ -120,116 +209,142 @@ class AddFaceScreen(Screen):
             
         self.is_capturing = True
         self.capture_button.disabled = True
-        self.captured_features = []
-        self.captured_images = []
-        self.capture_count = 0
+        self.samples = BestSamples(CAPTURE_LIMIT)
+        self.frames_seen = 0
+        self.rejected = 0
+        self.capture_samples = queue.Queue()
         self.info_label.text = "Starting capture process..."
         Clock.schedule_interval(self.capture_face, 0.1)
 
+    def end_capture(self):
+        """ Stop queueing and draining capture samples """
+        self.is_capturing = False
+        self.capture_samples = None
+        Clock.unschedule(self.capture_face)
+
+    @timed("add_face.capture_face")
     def capture_face(self, dt):
-        """ Capture faces and extract features """
-        if self.capture_count >= CAPTURE_LIMIT:
-            self.is_capturing = False
-            Clock.unschedule(self.capture_face)
-            self.process_captured_faces()
-            return False
-
-        ret, frame = self.capture.read()
-        if not ret:
-            return False
-
-        faces = self.face_model.get(frame)
-        if faces:
-            face = faces[0]
-            embedding = face.normed_embedding
-            self.captured_features.append(embedding)
-            self.captured_images.append(frame)
-            self.capture_count += 1
-            self.info_label.text = f"Capturing... {self.capture_count}/{CAPTURE_LIMIT}"
-            
+        """ Keep the best scoring captures until enough good ones exist """
+        # 取出推理线程排队的全部全分辨率样本
+        samples = self.capture_samples
+        status = None
+        while samples is not None:
+            try:
+                score, embedding, crop, reason = samples.get_nowait()
+            except queue.Empty:
+                break
+            self.frames_seen += 1
+            if reason is None:
+                self.samples.push(score, embedding, crop)
+                status = ""
+            else:
+                # 模糊、偏角度或过小的人脸直接丢弃
+                self.rejected += 1
+                metrics.count("add_face.rejected_frames")
+                status = f" - {reason}"
+
+            good = self.samples.count_above(GOOD_QUALITY)
+            if good >= GOOD_SAMPLES or self.frames_seen >= MAX_CAPTURE_FRAMES:
+                self.end_capture()
+                self.process_captured_faces()
+                return False
+
+        if status is not None:
+            good = self.samples.count_above(GOOD_QUALITY)
+            self.info_label.text = f"Capturing... {good}/{GOOD_SAMPLES} good samples{status}"
         return True
 
     def process_captured_faces(self):
-        """ Process and save captured faces """
-        if not self.captured_features:
-            self.info_label.text = "No faces captured. Try again."
+        """ Hand the captured faces to the enrollment worker """
+        if not len(self.samples):
+            self.info_label.text = "No usable face captured. Try again."
             self.capture_button.disabled = False
             return
 
-        self.info_label.text = "Processing captured faces..."
-        
-        # 计算平均特征
-        avg_features = np.mean(self.captured_features, axis=0).astype(np.float32)
-        
-        # 选择最清晰的图片
-        best_index = self.select_best_image(self.captured_images)
-        best_image = self.captured_images[best_index]
-        image_path = self.save_face_image(best_image, self.name_input.text.strip())
-
-        # 保存到数据库
         name = self.name_input.text.strip()
         relation = self.relation_input.text.strip()
-        save_face_data(name, relation, image_path, avg_features)
+        features, best_crop = self.samples.embeddings(), self.samples.best_crop
+        self.samples = BestSamples(CAPTURE_LIMIT)
+
+        # 保存前先检查是否已录入过相似的人脸
+        future = _save_executor.submit(check_duplicates, features)
+        future.add_done_callback(lambda f: Clock.schedule_once(
+            lambda dt: self.on_duplicate_check(name, relation, features, best_crop, f)))
 
-        # 重置UI
-        self.info_label.text = "Face saved successfully!"
+        # 立即重置UI，可以开始录入下一个人
+        self.info_label.text = f"Checking {name} against enrolled faces..."
         self.name_input.text = ""
         self.relation_input.text = ""
         self.capture_button.disabled = False
-        
+
+    def on_duplicate_check(self, name, relation, features, best_crop, future):
+        """ Save right away, or ask first if the face looks already enrolled (UI thread) """
+        try:
+            duplicates = future.result()
+        except Exception as e:
+            print(f"Duplicate check failed: {e}")
+            duplicates = []
+        if not duplicates:
+            self.save_in_background(name, relation, features, best_crop)
+            return
+
+        similar = ", ".join(f"{other} ({other_relation}, {score * 100:.0f}%)"
+                            for _, other, other_relation, score in duplicates)
+        # Several warnings can be open at once (capture continues meanwhile), so each
+        # dialog's buttons refer to that dialog rather than to a screen attribute
+        dialog = MDDialog(
+            title="Possible duplicate",
+            text=f"{name} looks like someone already enrolled: {similar}. Save anyway?",
+            buttons=[
+                MDRaisedButton(
+                    text="Cancel",
+                    on_release=lambda x: self.cancel_duplicate(dialog, name)
+                ),
+                MDFlatButton(
+                    text="Save anyway",
+                    on_release=lambda x: self.confirm_duplicate(dialog, name, relation, features, best_crop)
+                )
+            ]
+        )
+        dialog.open()
+
+    def cancel_duplicate(self, dialog, name):
+        dialog.dismiss()
+        self.show_status(f"{name} was not saved.")
+
+    def confirm_duplicate(self, dialog, name, relation, features, best_crop):
+        dialog.dismiss()
+        self.save_in_background(name, relation, features, best_crop)
+
+    def save_in_background(self, name, relation, features, best_crop):
+        """ Queue the enrollment on the worker and report back when it is saved """
+        future = _save_executor.submit(save_enrollment, name, relation, features, best_crop,
+                                       self.report_progress)
+        future.add_done_callback(
+            lambda f: Clock.schedule_once(lambda dt: self.on_saved(name, relation, f)))
+        self.show_status(f"Saving {name} in the background...")
+
+    def report_progress(self, text):
+        """ Show worker progress on the UI thread """
+        Clock.schedule_once(lambda dt: self.show_status(text))
+
+    def show_status(self, text):
+        """ Set the info label unless a new capture is using it """
+        if not self.is_capturing:
+            self.info_label.text = text
+
+    def on_saved(self, name, relation, future):
+        """ Report the finished enrollment (UI thread) """
+        error = future.exception()
+        if error is not None:
+            self.show_status(f"Failed to save {name}: {error}")
+            return
+        self.show_status(f"{name} saved successfully!")
+
+        # 预先合成欢迎语，识别到此人时可立即播放
+        voice_manager = getattr(MDApp.get_running_app(), "voice_manager", None)
+        if voice_manager is not None:
+            voice_manager.prerender_greeting(name, relation)
+
         # 延迟2秒后重置提示文字
-        Clock.schedule_once(lambda dt: setattr(self.info_label, 'text', 
-                          "Enter details and start capture."), 2)
-
-    def select_best_image(self, images):
-        """ Select sharpest image based on Laplacian variance """
-        def sharpness(image):
-            return cv2.Laplacian(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), cv2.CV_64F).var()
-
-        scores = [sharpness(img) for img in images]
-        return np.argmax(scores)
-
-    def save_face_image(self, image, name):
-        # 确保两个目录都存在
-        if not os.path.exists("saved_faces"):
-            os.makedirs("saved_faces")
-        if not os.path.exists("assets"):
-            os.makedirs("assets")
-
-        # 获取已存在的文件数量作为新的序号
-        existing_files = len(os.listdir("saved_faces"))
-        new_id = existing_files + 1
-        
-        # 保存到两个位置
-        save_path = f"saved_faces/face_{new_id}.png"
-        asset_path = f"assets/face_{new_id}.png"
-        
-        # 检测和裁剪人脸
-        faces = self.face_model.get(image)
-        if faces:
-            face = faces[0]
-            bbox = face.bbox.astype(int)
-            x1, y1, x2, y2 = bbox
-            
-            # 扩大裁剪区域（20%边距）
-            h, w = y2 - y1, x2 - x1
-            margin_h = int(h * 0.2)
-            margin_w = int(w * 0.2)
-            
-            # 确保边界不超出图像范围
-            y1 = max(0, y1 - margin_h)
-            y2 = min(image.shape[0], y2 + margin_h)
-            x1 = max(0, x1 - margin_w)
-            x2 = min(image.shape[1], x2 + margin_w)
-            
-            # 裁剪并调整大小
-            face_image = image[y1:y2, x1:x2]
-            face_image = cv2.resize(face_image, (256, 256))
-        else:
-            face_image = image  # 如果没检测到人脸，使用原图
-        
-        # 保存裁剪后的图片
-        cv2.imwrite(save_path, face_image)  # 保存到saved_faces
-        cv2.imwrite(asset_path, face_image)  # 保存到assets
-        
-        return asset_path  # 返回assets路径用于显示
+        Clock.schedule_once(lambda dt: self.show_status("Enter details and start capture."), 2)
@@ -0,0 +1,130 @@
+"""Headless bulk enrollment from a folder of photos.
+
+Expected layout: one sub-folder per person, named after them.
+
+    photos/
+        Alice/ 1.jpg 2.jpg ...
+        Bob/   a.png ...
+
+Usage: python BulkEnroll.py photos --relation Colleague [--workers 8]
+"""
+import argparse
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+
+import ManageFace
+from utils import face_images
+from utils import face_model
+from utils.face_templates import select_templates
+
+
+def process_image(job):
+    """Detect and embed the single face in one photo (runs in a worker process).
+
+    Returns (name, path, status, embedding, crop, sharpness).
+    """
+    name, path = job
+    image = cv2.imread(path)
+    if image is None:
+        return name, path, "unreadable", None, None, 0.0
+
+    faces = face_model.analyze_faces(face_model.get_model(), image)
+    if not faces:
+        return name, path, "no face", None, None, 0.0
+    if len(faces) > 1:
+        return name, path, f"{len(faces)} faces", None, None, 0.0
+
+    face = faces[0]
+    crop = face_images.crop_face(image, face.bbox)
+    return name, path, "ok", face.normed_embedding, crop, face_images.sharpness(crop)
+
+
+def find_images(root):
+    """List (person name, image path) for every photo under root/<name>/"""
+    jobs = []
+    for name in sorted(os.listdir(root)):
+        person_dir = os.path.join(root, name)
+        if not os.path.isdir(person_dir):
+            continue
+        for dirpath, _, filenames in os.walk(person_dir):
+            for filename in sorted(filenames):
+                if filename.lower().endswith(face_images.IMAGE_EXTENSIONS):
+                    jobs.append((name, os.path.join(dirpath, filename)))
+    return jobs
+
+
+def enroll(root, relation, workers, log_file=sys.stderr):
+    """Enroll every person under root; returns a summary dict"""
+    jobs = find_images(root)
+    workers = max(1, workers)
+    threads_per_worker = face_model.worker_threads(workers)
+
+    start = time.perf_counter()
+    features = {}  # name -> list of embeddings
+    best_crops = {}  # name -> (sharpness, crop)
+    skipped = 0
+
+    with Pool(workers, initializer=face_model.init_worker, initargs=(threads_per_worker,)) as pool:
+        for done, (name, path, status, embedding, crop, score) in enumerate(
+                pool.imap_unordered(process_image, jobs, chunksize=4), 1):
+            if status != "ok":
+                skipped += 1
+                print(f"skipped {path}: {status}", file=log_file)
+            else:
+                features.setdefault(name, []).append(embedding)
+                if name not in best_crops or score > best_crops[name][0]:
+                    best_crops[name] = (score, crop)
+            if done % 100 == 0:
+                rate = done / (time.perf_counter() - start)
+                print(f"{done}/{len(jobs)} images ({rate:.1f} img/s)")
+    extract_seconds = time.perf_counter() - start
+
+    # Average (plus diverse templates) per person like AddFaceScreen.process_captured_faces, then write in one transaction
+    records = []
+    for name, embeddings in features.items():
+        avg_features = np.mean(embeddings, axis=0).astype(np.float32)
+        image_path = face_images.save_face_image(best_crops[name][1])
+        records.append((name, relation, image_path, avg_features, select_templates(embeddings)))
+    ManageFace.save_faces_batch(records)
+    total_seconds = time.perf_counter() - start
+
+    return {
+        "images": len(jobs),
+        "skipped": skipped,
+        "people": len(records),
+        "extract_seconds": round(extract_seconds, 2),
+        "total_seconds": round(total_seconds, 2),
+        "images_per_second": round(len(jobs) / max(extract_seconds, 1e-9), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enroll people from a folder of photos")
+    parser.add_argument("root", help="Folder with one sub-folder of photos per person")
+    parser.add_argument("--relation", default="", help="Relation stored for every enrolled person")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: all cores)")
+    parser.add_argument("--db", default=ManageFace.DB_PATH, help="Database file")
+    parser.add_argument("--log", default=None, help="Write skipped images here instead of stderr")
+    args = parser.parse_args()
+
+    ManageFace.DB_PATH = args.db
+    log_file = open(args.log, "w", encoding="utf-8") if args.log else sys.stderr
+    try:
+        summary = enroll(args.root, args.relation, args.workers, log_file)
+    finally:
+        if args.log:
+            log_file.close()
+
+    print(f"Enrolled {summary['people']} people from {summary['images']} images "
+          f"({summary['skipped']} skipped) in {summary['total_seconds']}s, "
+          f"{summary['images_per_second']} img/s")
+
+
+if __name__ == "__main__":
+    main()
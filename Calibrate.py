@@ -0,0 +1,199 @@
+"""Benchmark inference settings on a reference clip and save the fastest accurate one.
+
+Tries detector input sizes, ONNX Runtime intra/inter-op thread counts and
+every execution provider available locally. The largest detector input
+with default threading is the reference: a candidate must find at least
+--min-recall of the reference faces with embeddings agreeing to
+--min-cosine. The fastest accepted configuration is written as a profile
+(utils.face_model.PROFILE_PATH) that the shared model loader applies.
+
+Usage: python Calibrate.py lobby.mp4 [--frames 60] [--det-sizes 320 480 640]
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from RecognizeStream import iter_frames
+from utils import face_model
+from utils.face_tracker import iou_matrix
+
+DET_SIZES = [160, 320, 480, 640]
+MIN_RECALL = 0.95  # Share of reference faces a candidate must still detect
+MIN_COSINE = 0.95  # Mean cosine between candidate and reference embeddings
+IOU_MATCH = 0.5  # A candidate box matches a reference box above this IoU
+WARMUP_FRAMES = 3  # Untimed frames after every configuration change
+
+
+def load_frames(source, count, every):
+    frames = []
+    for _, _, _, frame in iter_frames(source, every):
+        frames.append(frame)
+        if len(frames) >= count:
+            break
+    if not frames:
+        raise SystemExit(f"No frames read from {source}")
+    return frames
+
+
+def default_thread_counts():
+    """1, 2, 4, ... up to the core count (plus the core count itself)"""
+    cores = os.cpu_count() or 1
+    counts = []
+    n = 1
+    while n < cores:
+        counts.append(n)
+        n *= 2
+    counts.append(cores)
+    return counts
+
+
+def run_config(model, frames, det_size):
+    """Detect and embed every frame; returns (per-frame seconds, per-frame (bboxes, embeddings))"""
+    size = (det_size, det_size)
+    for frame in frames[:WARMUP_FRAMES]:
+        face_model.detect_faces(model, frame, input_size=size)
+
+    seconds, outputs = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        bboxes, kpss = face_model.detect_faces(model, frame, input_size=size)
+        if len(bboxes) and kpss is not None:
+            embeddings = face_model.embed_faces(model, frame, kpss)
+        else:
+            embeddings = np.empty((0, 512), dtype=np.float32)
+        seconds.append(time.perf_counter() - start)
+        outputs.append((bboxes, embeddings))
+    return seconds, outputs
+
+
+def accuracy(reference, outputs):
+    """(recall, mean cosine) of outputs against the reference detections"""
+    total, matched, cosines = 0, 0, []
+    for (ref_boxes, ref_embeddings), (boxes, embeddings) in zip(reference, outputs):
+        total += len(ref_boxes)
+        ious = iou_matrix(ref_boxes, boxes)
+        # Greedy one-to-one matching, best overlaps first
+        used_ref, used = set(), set()
+        for flat in np.argsort(-ious, axis=None):
+            i, j = np.unravel_index(flat, ious.shape)
+            if ious[i, j] < IOU_MATCH:
+                break
+            if i in used_ref or j in used:
+                continue
+            used_ref.add(i)
+            used.add(j)
+            matched += 1
+            cosines.append(float(ref_embeddings[i] @ embeddings[j]))
+    recall = matched / total if total else 1.0
+    return recall, float(np.mean(cosines)) if cosines else 1.0
+
+
+def measure(model, frames, det_size, reference):
+    seconds, outputs = run_config(model, frames, det_size)
+    recall, cosine = accuracy(reference, outputs) if reference is not None else (1.0, 1.0)
+    return {
+        "det_size": [det_size, det_size],
+        "ms_per_frame": round(float(np.median(seconds)) * 1000, 2),
+        "fps": round(1.0 / max(float(np.median(seconds)), 1e-9), 2),
+        "recall": round(recall, 4),
+        "cosine": round(cosine, 4),
+    }, outputs
+
+
+def calibrate(frames, det_sizes, thread_counts, inter_counts, providers, min_recall, min_cosine):
+    """Return (best configuration, every measured configuration)"""
+    results = []
+
+    def configure(model, provider, intra, inter):
+        face_model._configure_sessions(model, intra, inter, [provider])
+        model.prepare(ctx_id=-1 if provider == "CPUExecutionProvider" else 0)
+
+    model = face_model._create_model(profile={})  # Ignore any existing profile
+    configure(model, "CPUExecutionProvider", None, None)
+    reference_size = max(det_sizes)
+    reference, reference_outputs = measure(model, frames, reference_size, None)
+    print(f"reference: det {reference_size} {reference['ms_per_frame']} ms/frame")
+
+    for provider in providers:
+        try:
+            configure(model, provider, None, None)
+        except Exception as e:
+            print(f"skipping {provider}: {e}")
+            continue
+
+        # Detector size first (it decides accuracy), then threading for the fastest accurate size
+        accepted = []
+        for det_size in sorted(det_sizes):
+            result, _ = measure(model, frames, det_size, reference_outputs)
+            result.update(provider=provider, intra_op_threads=None, inter_op_threads=None)
+            result["accepted"] = result["recall"] >= min_recall and result["cosine"] >= min_cosine
+            results.append(result)
+            print(json.dumps(result))
+            if result["accepted"]:
+                accepted.append(result)
+        if not accepted:
+            continue
+        det_size = min(accepted, key=lambda r: r["ms_per_frame"])["det_size"][0]
+
+        for intra in thread_counts:
+            for inter in inter_counts:
+                configure(model, provider, intra, inter)
+                result, _ = measure(model, frames, det_size, reference_outputs)
+                result.update(provider=provider, intra_op_threads=intra, inter_op_threads=inter)
+                result["accepted"] = result["recall"] >= min_recall and result["cosine"] >= min_cosine
+                results.append(result)
+                print(json.dumps(result))
+
+    accepted = [result for result in results if result["accepted"]]
+    best = min(accepted, key=lambda r: r["ms_per_frame"]) if accepted else None
+    return best, results
+
+
+def main():
+    import onnxruntime
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="Reference clip, image folder or camera index")
+    parser.add_argument("--frames", type=int, default=60, help="Frames used per configuration")
+    parser.add_argument("--every", type=int, default=1, help="Use every N-th frame of the clip")
+    parser.add_argument("--det-sizes", type=int, nargs="+", default=DET_SIZES)
+    parser.add_argument("--threads", type=int, nargs="+", default=None,
+                        help="Intra-op thread counts (default: 1, 2, 4, ... cores)")
+    parser.add_argument("--inter-threads", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--providers", nargs="+", default=None,
+                        help="Execution providers (default: all available)")
+    parser.add_argument("--min-recall", type=float, default=MIN_RECALL)
+    parser.add_argument("--min-cosine", type=float, default=MIN_COSINE)
+    parser.add_argument("-o", "--output", default=face_model.PROFILE_PATH)
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.frames, args.every)
+    providers = args.providers or onnxruntime.get_available_providers()
+    best, results = calibrate(frames, args.det_sizes, args.threads or default_thread_counts(),
+                              args.inter_threads, providers, args.min_recall, args.min_cosine)
+    if best is None:
+        raise SystemExit("No configuration met the accuracy floor; profile not written")
+
+    profile = {
+        "det_size": best["det_size"],
+        "intra_op_threads": best["intra_op_threads"],
+        "inter_op_threads": best["inter_op_threads"],
+        "providers": [best["provider"]],
+        "ctx_id": -1 if best["provider"] == "CPUExecutionProvider" else 0,
+        "measured": {key: best[key] for key in ("ms_per_frame", "fps", "recall", "cosine")},
+        "source": args.source,
+        "cpu_count": os.cpu_count(),
+        "calibrated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    print(f"Profile written to {args.output}: {json.dumps(profile['measured'])} "
+          f"(det {best['det_size'][0]}, {best['provider']}, "
+          f"threads {best['intra_op_threads']}/{best['inter_op_threads']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+from kivy.core.image import Image as CoreImage
+from kivy.metrics import dp
+from kivy.properties import NumericProperty, StringProperty
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivymd.uix.list import IconRightWidget, TwoLineAvatarIconListItem, ImageLeftWidget
+from ManageFace import manage_face_page
+from utils.thumbnail_cache import ThumbnailCache, DEFAULT_IMAGE
+
+PAGE_SIZE = 50  # Rows fetched from the database per page
+ROW_HEIGHT = dp(72)
+LOAD_MORE_AT = 0.1  # Fetch the next page when scrolled this close to the bottom
+
+
+def _load_texture(path):
+    try:
+        return CoreImage(path).texture
+    except Exception as e:
+        print(f"Failed to load thumbnail {path}: {e}")
+        return None
+
+
+# Shared by every list instance so reopening the Faces tab hits warm thumbnails
+thumbnails = ThumbnailCache(_load_texture)
+
+
+class FaceListRow(RecycleDataViewBehavior, TwoLineAvatarIconListItem):
+    """ One recycled list row; only enough rows to fill the screen are ever built """
+    face_id = NumericProperty(0)
+    image_path = StringProperty("")
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.list_view = None
+        self.avatar = ImageLeftWidget()
+        self.add_widget(self.avatar)
+
+        delete_btn = IconRightWidget(icon="delete")
+        delete_btn.bind(on_release=lambda x: self.list_view.on_delete(self.face_id))
+        self.ids._right_container.add_widget(delete_btn)
+
+    def refresh_view_attrs(self, rv, index, data):
+        """ Rebind this row to another record as it scrolls into view """
+        self.list_view = rv
+        # ImageLeftWidget is a FitImage: it draws whatever `source` holds (a path or a Texture)
+        self.avatar.source = thumbnails.get(data["image_path"]) or DEFAULT_IMAGE
+        return super().refresh_view_attrs(rv, index, data)
+
+
+class FaceListView(RecycleView):
+    """ Virtualized face list fed page by page from ManageFace """
+
+    def __init__(self, on_delete, page_size=PAGE_SIZE, **kwargs):
+        super().__init__(**kwargs)
+        self.on_delete = on_delete  # Called with face_id when a row's delete button is pressed
+        self.page_size = page_size
+        self.last_id = 0  # Id of the last loaded record (keyset paging)
+        self.exhausted = False
+
+        self.viewclass = FaceListRow
+        layout = RecycleBoxLayout(orientation="vertical", size_hint_y=None,
+                                  default_size=(None, ROW_HEIGHT), default_size_hint=(1, None))
+        layout.bind(minimum_height=layout.setter("height"))
+        self.add_widget(layout)
+
+        self.load_page()
+        self.bind(scroll_y=self.on_scroll)
+
+    def load_page(self):
+        """ Append the next page of records """
+        if self.exhausted:
+            return
+        rows = manage_face_page(self.last_id, self.page_size)
+        if len(rows) < self.page_size:
+            self.exhausted = True
+        if rows:
+            self.last_id = rows[-1][0]
+            self.data.extend([{"face_id": face_id, "text": name, "secondary_text": relation or "",
+                               "image_path": image_path or ""}
+                              for face_id, name, relation, image_path in rows])
+
+    def on_scroll(self, instance, value):
+        if value <= LOAD_MORE_AT:
+            self.load_page()
+
+    def remove_face(self, face_id):
+        """ Drop a deleted record's row in place; returns the rows left """
+        for index, row in enumerate(self.data):
+            if row["face_id"] == face_id:
+                thumbnails.discard(row["image_path"])
+                del self.data[index]
+                break
+        if len(self.data) < self.page_size:
+            self.load_page()  # Keep the list scrollable after many deletes
+        return len(self.data)
@@ -0,0 +1,73 @@
+"""Find people enrolled more than once across the whole faces table.
+
+Compares every stored embedding with every other one in a blocked,
+vectorized similarity join (see utils.face_dedup), so 100k+ rows run in
+minutes with bounded memory. Writes one JSON object per near-duplicate
+pair, best first, and prints groups of records that look like one person.
+
+Usage: python FindDuplicates.py [-o duplicates.jsonl] [--threshold 0.6] [--db database.db]
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+import ManageFace
+from utils import face_dedup
+from utils.embedding_codec import normalize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("--threshold", type=float, default=face_dedup.DUPLICATE_THRESHOLD,
+                        help="Cosine similarity reported as a duplicate")
+    parser.add_argument("--block", type=int, default=face_dedup.BLOCK_SIZE,
+                        help="Rows per block (memory grows with its square)")
+    parser.add_argument("--db", default=ManageFace.DB_PATH, help="Database file")
+    args = parser.parse_args()
+
+    ManageFace.DB_PATH = args.db
+    start = time.perf_counter()
+    ids, names, relations, vectors = [], [], [], []
+    for face_id, name, relation, features in ManageFace.load_face_features():
+        if features is None or features.shape[0] != 512:
+            continue  # Skip invalid data
+        ids.append(face_id)
+        names.append(name)
+        relations.append(relation)
+        vectors.append(features)
+    if not vectors:
+        print("No face data found.", file=sys.stderr)
+        return
+    matrix = normalize(np.vstack(vectors))
+
+    first, second, scores = face_dedup.find_duplicate_pairs(matrix, args.threshold, args.block)
+    order = np.argsort(-scores)
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        for k in order.tolist():
+            a, b = int(first[k]), int(second[k])
+            output.write(json.dumps({
+                "score": round(float(scores[k]) * 100, 2),
+                "a": {"id": ids[a], "name": names[a], "relation": relations[a]},
+                "b": {"id": ids[b], "name": names[b], "relation": relations[b]},
+                "same_name": names[a] == names[b],
+            }, ensure_ascii=False) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    groups = face_dedup.group_pairs(len(ids), first, second)
+    for rows in sorted(groups, key=len, reverse=True):
+        print("Possible single person: " + ", ".join(f"{names[row]} (id {ids[row]})" for row in rows),
+              file=sys.stderr)
+    print(f"{len(ids)} faces, {len(scores)} duplicate pairs in {len(groups)} groups "
+          f"({time.perf_counter() - start:.1f} s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,108 +1,422 @@
+import itertools
+import secrets
 import sqlite3
+import threading
+from contextlib import contextmanager
 import numpy as np
 import os
+from utils import embedding_codec
+from utils.perf_metrics import timed
 
 DB_PATH = "database.db"
 
+# Storage format for new embeddings: "float32", "float16" (2x smaller) or "int8" (4x smaller)
+FEATURE_FORMAT = "float32"
 
-def init_db():
-    """Create the database and the 'faces' table if it doesn't exist."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
+# Callbacks fired as callback(op, face_id) after the faces table changes
+_change_listeners = []
+
+# One long-lived connection (and batch state) per thread
+_local = threading.local()
+_initialized_paths = set()
+_init_lock = threading.Lock()
+_connection_numbers = itertools.count(1)  # Tells apart connections a thread opened over time
+
+# SQL kept as constants so sqlite3's statement cache reuses the prepared statements
+_INSERT_FACE_SQL = """
+    INSERT INTO faces (name, relation, image_path, features, feature_format, feature_scale)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+_UPDATE_FACE_SQL = "UPDATE faces SET name=?, relation=? WHERE id=?"
+_DELETE_FACE_SQL = "DELETE FROM faces WHERE id=?"
+_SELECT_FACE_SQL = """
+    SELECT id, name, relation, image_path, features, feature_format, feature_scale
+    FROM faces WHERE id=?
+"""
+_BUMP_REVISION_SQL = "UPDATE meta SET value = value + 1 WHERE key = 'revision'"
+_LOG_CHANGE_SQL = "INSERT INTO face_changes (op, face_id) VALUES (?, ?)"
+_PRUNE_CHANGES_SQL = "DELETE FROM face_changes WHERE seq <= ?"
+
+# Changelog rows kept for other processes to catch up from; older readers reload fully
+CHANGELOG_LIMIT = 10000
+# Ids per "IN (...)" query when reading selected faces (SQLite limits bound parameters)
+SELECT_CHUNK = 500
+_INSERT_TEMPLATE_SQL = """
+    INSERT INTO face_templates (face_id, features, feature_format, feature_scale)
+    VALUES (?, ?, ?, ?)
+"""
+_SELECT_TEMPLATES_SQL = """
+    SELECT features, feature_format, feature_scale
+    FROM face_templates WHERE face_id=? ORDER BY id
+"""
+_DELETE_TEMPLATES_SQL = "DELETE FROM face_templates WHERE face_id=?"
+
+
+def _create_schema(conn):
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS faces (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
             relation TEXT,
             image_path TEXT NOT NULL,
-            features BLOB NOT NULL
+            features BLOB NOT NULL,
+            feature_format TEXT NOT NULL DEFAULT 'float32',
+            feature_scale REAL
+        )
+    """)
+    # Upgrade databases created before compact embedding storage
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(faces)")}
+    if "feature_format" not in columns:
+        conn.execute("ALTER TABLE faces ADD COLUMN feature_format TEXT NOT NULL DEFAULT 'float32'")
+    if "feature_scale" not in columns:
+        conn.execute("ALTER TABLE faces ADD COLUMN feature_scale REAL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_faces_name ON faces (name)")
+    # Extra embeddings per person (pose/lighting variety); faces.features stays the mean
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS face_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            face_id INTEGER NOT NULL REFERENCES faces (id),
+            features BLOB NOT NULL,
+            feature_format TEXT NOT NULL DEFAULT 'float32',
+            feature_scale REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_face_templates_face_id ON face_templates (face_id)")
+    # Revision counter bumped by every write, used to validate gallery snapshots
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0)")
+    # Random id of this database file: caches of a deleted and recreated database never match it
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('database_id', ?)", (secrets.randbits(62),))
+    # Append-only log of changed face ids, read by other processes' galleries
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS face_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            op TEXT NOT NULL,
+            face_id INTEGER NOT NULL
         )
     """)
     conn.commit()
-    conn.close()
 
 
-def save_face_data(name, relation, image_path, features):
-    """Save a new face record in the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO faces (name, relation, image_path, features)
-        VALUES (?, ?, ?, ?)
-    """, (name, relation, image_path, features.tobytes()))
-    conn.commit()
-    conn.close()
+def get_connection():
+    """Return this thread's persistent connection, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == DB_PATH:
+        return conn
+    if conn is not None:
+        conn.close()  # DB_PATH changed since this thread connected
+
+    conn = sqlite3.connect(DB_PATH, cached_statements=256)
+    conn.execute("PRAGMA journal_mode=WAL")  # Readers never block the writer
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    with _init_lock:
+        if DB_PATH not in _initialized_paths:
+            _create_schema(conn)
+            _initialized_paths.add(DB_PATH)
+
+    _local.conn = conn
+    _local.path = DB_PATH
+    _local.connection_number = next(_connection_numbers)
+    return conn
+
+
+def close_connection():
+    """Close this thread's connection (it is reopened on next use)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+@contextmanager
+def batch():
+    """Run several writes in a single transaction.
+
+    Writes made inside the block are committed together (or rolled back
+    on error) and change listeners are notified once it commits. Nested
+    batches join the outermost one. Callbacks registered with
+    _after_commit() run after the commit and are dropped on rollback.
+    """
+    if getattr(_local, "batch_depth", 0):
+        _local.batch_depth += 1
+        try:
+            yield get_connection()
+        finally:
+            _local.batch_depth -= 1
+        return
+
+    conn = get_connection()
+    _local.batch_depth = 1
+    _local.pending_changes = []
+    _local.after_commit = []
+    try:
+        with conn:
+            yield conn
+        changes = _local.pending_changes
+        callbacks = _local.after_commit
+    finally:
+        _local.batch_depth = 0
+        _local.pending_changes = []
+        _local.after_commit = []
+
+    for op, face_id in changes:
+        _notify_change(op, face_id)
+    for callback in callbacks:
+        callback()
+
+
+def _after_commit(callback):
+    """Run callback once the enclosing batch() commits (never if it rolls back)."""
+    if getattr(_local, "batch_depth", 0):
+        _local.after_commit.append(callback)
+    else:
+        callback()
+
+
+def get_revision():
+    """Return the database revision; it changes whenever the faces table does."""
+    return get_connection().execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+
+def get_database_id():
+    """Return the random id chosen when this database file was created."""
+    return get_connection().execute("SELECT value FROM meta WHERE key = 'database_id'").fetchone()[0]
+
+
+def get_change_seq():
+    """Return the sequence number of the newest changelog entry (0 if none)."""
+    row = get_connection().execute("SELECT seq FROM sqlite_sequence WHERE name = 'face_changes'").fetchone()
+    return row[0] if row else 0
+
+
+def changes_since(seq):
+    """Return (newest_seq, [(op, face_id), ...]) for changes after seq.
+
+    Returns (newest_seq, None) if entries after seq were already pruned,
+    in which case the caller has to reload everything.
+    """
+    conn = get_connection()
+    own_transaction = not conn.in_transaction
+    if own_transaction:
+        conn.execute("BEGIN")  # Both queries read the same snapshot
+    try:
+        rows = conn.execute("SELECT seq, op, face_id FROM face_changes WHERE seq > ? ORDER BY seq",
+                            (seq,)).fetchall()
+        if not rows:
+            return seq, []  # Not newest_seq: a commit landing now must still be read next time
+        if rows[0][0] != seq + 1 and conn.execute(
+                "SELECT 1 FROM face_changes WHERE seq <= ? LIMIT 1", (seq,)).fetchone() is None:
+            return rows[-1][0], None  # Gap: the entries in between were pruned
+        return rows[-1][0], [(op, face_id) for _, op, face_id in rows]
+    finally:
+        if own_transaction:
+            conn.commit()
+
+
+def data_version():
+    """Return a cheap token that changes when another connection commits.
+
+    Uses PRAGMA data_version of this thread's connection, so tokens are
+    only comparable within one thread. Callers keep the last token they
+    saw, per thread, and compare.
+    """
+    conn = get_connection()
+    return DB_PATH, _local.connection_number, conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def _record_change(conn, op, face_id):
+    """Bump the revision, append to the changelog and notify listeners."""
+    conn.execute(_BUMP_REVISION_SQL)
+    seq = conn.execute(_LOG_CHANGE_SQL, (op, face_id)).lastrowid
+    if seq > CHANGELOG_LIMIT:
+        conn.execute(_PRUNE_CHANGES_SQL, (seq - CHANGELOG_LIMIT,))
+    _notify_change(op, face_id)
+
+
+def init_db():
+    """Create the database and the 'faces' table if it doesn't exist."""
+    _create_schema(get_connection())
+
+
+@timed("db.save_face_data")
+def save_face_data(name, relation, image_path, features, templates=None):
+    """Save a new face record (and optional extra templates) in the database."""
+    blob, scale = embedding_codec.encode(features, FEATURE_FORMAT)
+    with batch() as conn:
+        cursor = conn.execute(_INSERT_FACE_SQL, (name, relation, image_path, blob, FEATURE_FORMAT, scale))
+        face_id = cursor.lastrowid
+        _insert_templates(conn, face_id, templates)
+        _record_change(conn, "insert", face_id)
+    return face_id
+
+
+def save_faces_batch(records):
+    """Save many (name, relation, image_path, features[, templates]) records in one transaction.
 
+    Returns the new face ids in the same order.
+    """
+    face_ids = []
+    with batch():
+        for record in records:
+            face_ids.append(save_face_data(*record))
+    return face_ids
 
+
+def _insert_templates(conn, face_id, templates):
+    if templates is None:
+        return
+    rows = []
+    for features in templates:
+        blob, scale = embedding_codec.encode(features, FEATURE_FORMAT)
+        rows.append((face_id, blob, FEATURE_FORMAT, scale))
+    conn.executemany(_INSERT_TEMPLATE_SQL, rows)
+
+
+@timed("db.add_face_templates")
+def add_face_templates(face_id, templates, max_templates=None):
+    """Append templates to an existing face, keeping at most max_templates (newest win)."""
+    with batch() as conn:
+        _insert_templates(conn, face_id, templates)
+        if max_templates is not None:
+            conn.execute("""
+                DELETE FROM face_templates WHERE face_id=? AND id NOT IN (
+                    SELECT id FROM face_templates WHERE face_id=? ORDER BY id DESC LIMIT ?)
+            """, (face_id, face_id, max_templates))
+        _record_change(conn, "update", face_id)
+
+
+@timed("db.get_face_templates")
+def get_face_templates(face_id):
+    """Return the extra templates of one face as decoded float32 vectors."""
+    cursor = get_connection().execute(_SELECT_TEMPLATES_SQL, (face_id,))
+    return [embedding_codec.decode(blob, fmt, scale) for blob, fmt, scale in cursor]
+
+
+def _select(sql, column, face_ids=None):
+    """Run sql (with a {where} placeholder) for all rows, or only those of face_ids.
+
+    Ids are sent in chunks of SELECT_CHUNK "IN (...)" parameters.
+    """
+    conn = get_connection()
+    if face_ids is None:
+        return conn.execute(sql.format(where="")).fetchall()
+    face_ids = list(face_ids)
+    rows = []
+    for start in range(0, len(face_ids), SELECT_CHUNK):
+        chunk = face_ids[start:start + SELECT_CHUNK]
+        where = f"WHERE {column} IN ({','.join('?' * len(chunk))})"
+        rows.extend(conn.execute(sql.format(where=where), chunk).fetchall())
+    return rows
+
+
+@timed("db.load_face_templates")
+def load_face_templates(face_ids=None):
+    """Retrieve (face_id, features) for every extra template, grouped by face.
+
+    Pass face_ids to only read the templates of those faces.
+    """
+    rows = _select("SELECT face_id, features, feature_format, feature_scale FROM face_templates "
+                   "{where} ORDER BY face_id, id", "face_id", face_ids)
+    return [(face_id, embedding_codec.decode(blob, fmt, scale)) for face_id, blob, fmt, scale in rows]
+
+
+@timed("db.manage_face")
 def manage_face():
     """Retrieve all face records from the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, relation, image_path FROM faces")
-    faces = cursor.fetchall()  # Get all stored face records
-    conn.close()
-    return faces  # Return a list of face records
+    cursor = get_connection().execute("SELECT id, name, relation, image_path FROM faces")
+    return cursor.fetchall()  # Return a list of face records
+
+
+@timed("db.manage_face_page")
+def manage_face_page(after_id=0, limit=50):
+    """Retrieve up to limit face records with id > after_id, ordered by id.
+
+    Keyset paging: pass the last id of one page to get the next one, so
+    every page costs the same however large the table is.
+    """
+    cursor = get_connection().execute(
+        "SELECT id, name, relation, image_path FROM faces WHERE id > ? ORDER BY id LIMIT ?",
+        (after_id, limit))
+    return cursor.fetchall()
+
+
+@timed("db.load_face_features")
+def load_face_features(face_ids=None):
+    """Retrieve (id, name, relation, features) for every face record.
 
+    Features are decoded to float32 vectors whatever format they are stored
+    in. Pass face_ids to only read those records (missing ids are skipped).
+    """
+    rows = _select("SELECT id, name, relation, features, feature_format, feature_scale FROM faces {where}",
+                   "id", face_ids)
+    return [(face_id, name, relation, embedding_codec.decode(blob, fmt, scale))
+            for face_id, name, relation, blob, fmt, scale in rows]
 
+
+@timed("db.delete_face")
 def delete_face(face_id):
     """删除指定ID的face记录及其关联图片"""
-    # 先获取face记录信息
-    face = get_face_by_id(face_id)
-    
-    # 如果找到记录且存在图片路径，则删除图片
-    if face and face['image_path']:
-        try:
-            if os.path.exists(face['image_path']):
-                os.remove(face['image_path'])
-        except Exception as e:
-            print(f"删除图片文件时出错: {e}")
-    
-    # 删除数据库记录
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM faces WHERE id=?", (face_id,))
-    conn.commit()
-    conn.close()
+    with batch() as conn:
+        # 先获取face记录信息
+        face = get_face_by_id(face_id)
+
+        # 删除数据库记录
+        conn.execute(_DELETE_TEMPLATES_SQL, (face_id,))
+        conn.execute(_DELETE_FACE_SQL, (face_id,))
+        _record_change(conn, "delete", face_id)
 
+        # 事务提交后再删除图片，回滚时图片保留
+        if face and face['image_path']:
+            _after_commit(lambda: _remove_image(face['image_path']))
 
+
+def _remove_image(image_path):
+    try:
+        if os.path.exists(image_path):
+            os.remove(image_path)
+    except Exception as e:
+        print(f"删除图片文件时出错: {e}")
+
+
+def delete_faces(face_ids):
+    """Delete many face records in one transaction; images are removed once it commits."""
+    with batch():
+        for face_id in face_ids:
+            delete_face(face_id)
+
+
+@timed("db.update_face")
 def update_face(face_id, new_name, new_relation):
     """Update the name and relation of a face record."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE faces SET name=?, relation=? WHERE id=?", (new_name, new_relation, face_id))
-    conn.commit()
-    conn.close()
+    with batch() as conn:
+        conn.execute(_UPDATE_FACE_SQL, (new_name, new_relation, face_id))
+        _record_change(conn, "update", face_id)
+
+
+def update_faces(updates):
+    """Apply many (face_id, new_name, new_relation) updates in one transaction."""
+    with batch():
+        for face_id, new_name, new_relation in updates:
+            update_face(face_id, new_name, new_relation)
 
 
 def add_test_data():
     """Insert sample face data into the database for testing."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     # Add 3 sample face records
-    cursor.executemany("""
-        INSERT INTO faces (name, relation, image_path, features) 
-        VALUES (?, ?, ?, ?)
-    """, [
-        ("Alice", "Friend", "assets/alice.png", b'\x00' * 512),
-        ("Bob", "Brother", "assets/bob.png", b'\x00' * 512),
-        ("Charlie", "Colleague", "assets/charlie.png", b'\x00' * 512)
-    ])
-
-    conn.commit()
-    conn.close()
+    with batch() as conn:
+        for record in [
+            ("Alice", "Friend", "assets/alice.png", b'\x00' * 512, "float32", None),
+            ("Bob", "Brother", "assets/bob.png", b'\x00' * 512, "float32", None),
+            ("Charlie", "Colleague", "assets/charlie.png", b'\x00' * 512, "float32", None)
+        ]:
+            _record_change(conn, "insert", conn.execute(_INSERT_FACE_SQL, record).lastrowid)
 
 
 def view_database():
     """Display all records from the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     # Fetch all records from the database
-    cursor.execute("SELECT * FROM faces")
-    rows = cursor.fetchall()
-
-    conn.close()
+    rows = get_connection().execute("SELECT * FROM faces").fetchall()
 
     # Print data if available
     if not rows:
@@ -112,13 +426,34 @@ def view_database():
             print(row)  # Display each record
 
 
+def add_change_listener(callback):
+    """Register a callback(op, face_id) called after insert/update/delete."""
+    if callback not in _change_listeners:
+        _change_listeners.append(callback)
+
+
+def remove_change_listener(callback):
+    """Unregister a callback added with add_change_listener()."""
+    if callback in _change_listeners:
+        _change_listeners.remove(callback)
+
+
+def _notify_change(op, face_id):
+    """Notify every registered listener that a face record changed.
+
+    Inside batch() the notification is deferred until the commit.
+    """
+    if getattr(_local, "batch_depth", 0):
+        _local.pending_changes.append((op, face_id))
+        return
+    for callback in list(_change_listeners):
+        callback(op, face_id)
+
+
+@timed("db.get_face_by_id")
 def get_face_by_id(face_id):
     """获取指定ID的face记录详细信息"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, relation, image_path, features FROM faces WHERE id=?", (face_id,))
-    face = cursor.fetchone()
-    conn.close()
+    face = get_connection().execute(_SELECT_FACE_SQL, (face_id,)).fetchone()
     
     if face:
         return {
@@ -126,13 +461,6 @@ def get_face_by_id(face_id):
             'name': face[1],
             'relation': face[2],
             'image_path': face[3],
-            'features': face[4]
+            'features': embedding_codec.decode(face[4], face[5], face[6])
         }
     return None
-
-
-#Initialize the database
-init_db()
-
-# View all stored data
-view_database()
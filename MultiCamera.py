@@ -0,0 +1,192 @@
+"""Recognize faces on several cameras or streams at once with a process pool.
+
+Each source is read on its own capture thread, keeping only its newest
+frame (OpenCV decodes without holding the GIL). Inference runs in a pool
+of worker processes, each with its own model copy. All workers share one
+read-only gallery: they memory-map the same snapshot file.
+
+Scheduling is round-robin with at most one frame in flight per stream,
+so a busy camera cannot starve the others. Frames that arrive while
+their stream is in flight are dropped and counted.
+
+Usage: python MultiCamera.py 0 1 rtsp://cam3/stream [--workers 4] [-o results.jsonl] [--duration 60]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from multiprocessing import Pool
+
+import numpy as np
+
+import ManageFace
+from utils import face_gallery
+from utils import face_model
+from utils.frame_pipeline import LatestFrameCapture, open_source
+
+STATS_INTERVAL = 5.0  # Seconds between per-stream stats lines
+LATENCY_WINDOW = 256  # Samples per stream for latency percentiles
+
+_gallery = None  # Per-worker view of the shared gallery snapshot
+
+
+def _init_worker(threads_per_worker, db_path):
+    """Load one model per worker and map the shared gallery snapshot"""
+    global _gallery
+    ManageFace.DB_PATH = db_path
+    face_gallery.SNAPSHOT_MIN_SIZE = 0  # Always use the memory-mapped snapshot
+    face_model.init_worker(threads_per_worker)
+    _gallery = face_gallery.FaceGallery(sync_interval=face_gallery.SYNC_INTERVAL)
+    _gallery.refresh()
+
+
+def recognize_frame(job):
+    """Detect, embed and match one frame (runs in a worker process).
+
+    Returns (stream index, frame id, faces, inference seconds).
+    """
+    stream, frame_id, frame = job
+    start = time.perf_counter()
+    faces = face_model.analyze_faces(face_model.get_model(), frame)
+    matches = _gallery.match_batch(np.stack([face.normed_embedding for face in faces])) if faces else []
+    results = [{"bbox": [round(float(v), 1) for v in face.bbox[:4]],
+                "name": face_matches[0][0],
+                "score": round(face_matches[0][1], 2)}
+               for face, face_matches in zip(faces, matches)]
+    return stream, frame_id, results, time.perf_counter() - start
+
+
+class StreamStats:
+    """Frame counters and capture-to-result latency of one stream"""
+
+    def __init__(self):
+        self.processed = 0
+        self.dropped = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.inference = deque(maxlen=LATENCY_WINDOW)
+        self.window_start = time.perf_counter()
+        self.window_processed = 0
+
+    def report(self, now):
+        """Stats since the previous report (fps) plus rolling latency percentiles"""
+        elapsed = max(now - self.window_start, 1e-9)
+        latencies = np.asarray(self.latencies) * 1000
+        inference = np.asarray(self.inference) * 1000
+        report = {
+            "fps": round(self.window_processed / elapsed, 2),
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "latency_p50_ms": round(float(np.percentile(latencies, 50)), 1) if latencies.size else None,
+            "latency_p95_ms": round(float(np.percentile(latencies, 95)), 1) if latencies.size else None,
+            "inference_p50_ms": round(float(np.percentile(inference, 50)), 1) if inference.size else None,
+        }
+        self.window_start = now
+        self.window_processed = 0
+        return report
+
+
+def run(sources, workers, output, duration=None, stats_interval=STATS_INTERVAL):
+    # Build the gallery snapshot once so every worker maps the same file
+    face_gallery.SNAPSHOT_MIN_SIZE = 0
+    gallery = face_gallery.FaceGallery()
+    gallery.refresh()
+    gallery.close()
+
+    captures = []
+    for index, source in enumerate(sources):
+        capture = LatestFrameCapture(open_source(source), name=f"stream{index}")
+        if not capture.isOpened():
+            raise SystemExit(f"Unable to open source: {source}")
+        capture.start()
+        captures.append(capture)
+
+    stats = [StreamStats() for _ in sources]
+    last_sent = [0] * len(sources)  # Newest frame id submitted per stream
+    in_flight = {}  # stream -> (AsyncResult, submit time)
+    threads_per_worker = face_model.worker_threads(workers)
+    next_stream = 0
+
+    start = last_stats = time.perf_counter()
+    with Pool(workers, initializer=_init_worker, initargs=(threads_per_worker, ManageFace.DB_PATH)) as pool:
+        try:
+            while duration is None or time.perf_counter() - start < duration:
+                idle = True
+
+                # Collect finished frames
+                for stream, (result, submitted) in list(in_flight.items()):
+                    if not result.ready():
+                        continue
+                    del in_flight[stream]
+                    idle = False
+                    stream, frame_id, faces, seconds = result.get()
+                    stream_stats = stats[stream]
+                    stream_stats.processed += 1
+                    stream_stats.window_processed += 1
+                    stream_stats.latencies.append(time.perf_counter() - submitted)
+                    stream_stats.inference.append(seconds)
+                    if output is not None:
+                        output.write(json.dumps({"stream": sources[stream], "frame": frame_id,
+                                                 "time": round(time.time(), 3), "faces": faces},
+                                                ensure_ascii=False) + "\n")
+
+                # Round-robin: every idle stream with a new frame gets one slot per pass
+                for offset in range(len(sources)):
+                    stream = (next_stream + offset) % len(sources)
+                    if stream in in_flight or len(in_flight) >= workers:
+                        continue
+                    frame_id, frame = captures[stream].read()
+                    if frame is None or frame_id == last_sent[stream]:
+                        continue
+                    stats[stream].dropped += max(0, frame_id - last_sent[stream] - 1)
+                    last_sent[stream] = frame_id
+                    in_flight[stream] = (pool.apply_async(recognize_frame, ((stream, frame_id, frame),)),
+                                         time.perf_counter())
+                    idle = False
+                next_stream = (next_stream + 1) % len(sources)
+
+                now = time.perf_counter()
+                if now - last_stats >= stats_interval:
+                    for source, stream_stats in zip(sources, stats):
+                        print(json.dumps({"stream": source, **stream_stats.report(now)}), file=sys.stderr)
+                    last_stats = now
+                if all(capture.failed and capture.frame_id == sent
+                       for capture, sent in zip(captures, last_sent)) and not in_flight:
+                    break  # Every source has ended (files) or died
+                if idle:
+                    time.sleep(0.002)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for capture in captures:
+                capture.stop()
+                capture.capture.release()
+
+    now = time.perf_counter()
+    return {source: stream_stats.report(now) for source, stream_stats in zip(sources, stats)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sources", nargs="+", help="Camera indices, video files or stream URLs")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Inference processes (each loads its own model)")
+    parser.add_argument("-o", "--output", default=None, help="JSONL file for per-frame results")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after N seconds")
+    parser.add_argument("--stats-every", type=float, default=STATS_INTERVAL)
+    parser.add_argument("--db", default=ManageFace.DB_PATH, help="Database file")
+    args = parser.parse_args()
+
+    ManageFace.DB_PATH = args.db
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        summary = run(args.sources, max(1, args.workers), output, args.duration, args.stats_every)
+    finally:
+        if output is not None:
+            output.close()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Build an INT8 copy of the detector and recognizer model pack.
+
+Dynamic quantization needs no data. Static (QDQ) quantization calibrates
+activation ranges on a folder of face photos and is usually the faster
+of the two on CPU for these convolutional models.
+
+The pack is written next to the original (e.g. ~/.insightface/models/
+buffalo_s_int8) and loaded with FACE_MODEL=buffalo_s_int8. Compare it
+with the float model first: python benchmarks/bench_quantized.py photos/
+
+Usage: python Quantize.py [--mode static --calibration photos/] [--name buffalo_s_int8]
+"""
+import argparse
+import os
+import random
+
+import cv2
+import numpy as np
+
+from BulkEnroll import find_images
+from utils import face_model
+
+CALIBRATION_IMAGES = 200  # Photos sampled for static calibration
+
+
+def detector_blob(detector, image):
+    """Preprocess an image exactly like insightface's SCRFD.detect"""
+    input_size = tuple(detector.input_size or face_model.DEFAULT_DET_SIZE)
+    im_ratio = image.shape[0] / image.shape[1]
+    model_ratio = input_size[1] / input_size[0]
+    if im_ratio > model_ratio:
+        new_height = input_size[1]
+        new_width = int(new_height / im_ratio)
+    else:
+        new_width = input_size[0]
+        new_height = int(new_width * im_ratio)
+    det_img = np.zeros((input_size[1], input_size[0], 3), dtype=np.uint8)
+    det_img[:new_height, :new_width, :] = cv2.resize(image, (new_width, new_height))
+    return cv2.dnn.blobFromImage(det_img, 1.0 / detector.input_std, input_size,
+                                 (detector.input_mean,) * 3, swapRB=True)
+
+
+def recognizer_blob(recognizer, crop):
+    """Preprocess an aligned face crop exactly like insightface's ArcFaceONNX.get_feat"""
+    return cv2.dnn.blobFromImages([crop], 1.0 / recognizer.input_std, tuple(recognizer.input_size),
+                                  (recognizer.input_mean,) * 3, swapRB=True)
+
+
+def calibration_blobs(model, paths):
+    """Detector and recognizer input tensors for static calibration"""
+    from insightface.utils import face_align
+
+    detector = model.models["detection"]
+    recognizer = model.models["recognition"]
+    det_blobs, rec_blobs = [], []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        det_blobs.append(detector_blob(detector, image))
+        _, kpss = face_model.detect_faces(model, image)
+        for kps in (kpss if kpss is not None else []):
+            crop = face_align.norm_crop(image, landmark=kps, image_size=recognizer.input_size[0])
+            rec_blobs.append(recognizer_blob(recognizer, crop))
+    return det_blobs, rec_blobs
+
+
+def quantize_file(source, target, mode, blobs=None):
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_dynamic, quantize_static)
+
+    if mode == "dynamic":
+        quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+        return
+
+    class BlobReader(CalibrationDataReader):
+        def __init__(self, input_name):
+            self.items = iter({input_name: blob} for blob in blobs)
+
+        def get_next(self):
+            return next(self.items, None)
+
+    import onnx
+    input_name = onnx.load(source, load_external_data=False).graph.input[0].name
+    quantize_static(source, target, BlobReader(input_name), quant_format=QuantFormat.QDQ,
+                    per_channel=True, weight_type=QuantType.QInt8, activation_type=QuantType.QUInt8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("dynamic", "static"), default="dynamic")
+    parser.add_argument("--calibration", help="Photo folder (<name>/*.jpg) for static calibration")
+    parser.add_argument("--images", type=int, default=CALIBRATION_IMAGES)
+    parser.add_argument("--source", default="buffalo_s", help="Float model pack")
+    parser.add_argument("--name", default=None, help="Output pack (default: <source>_int8)")
+    args = parser.parse_args()
+    if args.mode == "static" and not args.calibration:
+        parser.error("--mode static needs --calibration")
+
+    model = face_model._create_model(profile={}, name=args.source)
+    target_dir = face_model.model_dir(args.name or f"{args.source}_int8")
+    os.makedirs(target_dir, exist_ok=True)
+
+    blobs = {"detection": None, "recognition": None}
+    if args.mode == "static":
+        paths = [path for _, path in find_images(args.calibration)]
+        random.Random(0).shuffle(paths)
+        blobs["detection"], blobs["recognition"] = calibration_blobs(model, paths[:args.images])
+        print(f"Calibrating on {len(blobs['detection'])} images, {len(blobs['recognition'])} faces")
+        if not blobs["recognition"]:
+            raise SystemExit("No faces found in the calibration images")
+
+    for stage in face_model.MODEL_MODULES:
+        source = model.models[stage].model_file
+        target = os.path.join(target_dir, os.path.basename(source))
+        quantize_file(source, target, args.mode, blobs[stage])
+        print(f"{stage}: {os.path.getsize(source) / 2 ** 20:.1f} MB -> "
+              f"{os.path.getsize(target) / 2 ** 20:.1f} MB ({target})")
+
+
+if __name__ == "__main__":
+    main()
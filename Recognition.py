@@ -1,37 +1,52 @@
-from kivymd.app import MDApp
+import os
+from functools import partial
+
 import cv2
 import numpy as np
-import sqlite3
 from kivy.clock import Clock
-from kivy.graphics.texture import Texture
 from kivy.uix.image import Image
 from kivy.uix.screenmanager import Screen
 from kivymd.uix.label import MDLabel
 from kivymd.uix.button import MDRaisedButton
+from kivymd.app import MDApp
 from kivy.uix.boxlayout import BoxLayout
-from insightface.app import FaceAnalysis
-from ManageFace import manage_face  # Import database functions
-
-# Initialize ArcFace (lightweight model for face recognition)
-app = FaceAnalysis(name="buffalo_s")
-app.prepare(ctx_id=-1)  # -1 means using CPU (set GPU index if available)
+from utils.face_gallery import shared_gallery, SYNC_INTERVAL
+from utils.frame_pipeline import FramePipeline
+from utils.display_sink import DisplaySink
+from utils.face_tracker import FaceTracker
+from utils.face_model import when_model_ready, analyze_faces
+from utils.recognition_client import RecognitionClient
+from utils.perf_metrics import metrics
+from utils.perf_overlay import add_perf_overlay
 
 # Camera index (0 = front, 1 = back)
 current_camera = 0
 
+# Detect every few frames and follow faces in between instead of full inference per frame
+TRACKING_MODE = True
+
+# URL of a RecognitionServer to offload inference to (None = run the model locally)
+RECOGNITION_SERVER = os.environ.get("FACE_SERVER") or None
+
+# Greet recognized people by voice (VoiceManager rate-limits each person)
+VOICE_GREETINGS = True
+
 
 class RecognitionScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.face_model = MDApp.get_running_app().face_model
-        self.capture = None  # Camera object
-        self.clock_event = None  # Clock for updating frames
+        self.face_model = None  # Shared ArcFace model, set once loaded
+        self.pipeline = None  # Capture -> inference pipeline
+        self.clock_event = None  # Clock for rendering frames
+        self.rendered_id = 0  # Frame id of the last rendered result
+        self.tracker = None  # Face tracker for TRACKING_MODE
 
         # UI Components
         self.layout = BoxLayout(orientation="vertical")
 
         self.image = Image(allow_stretch=True, keep_ratio=True)  # Camera feed display
-        self.username_label = MDLabel(text="Detecting...", halign="center", font_style="H6")
+        self.display = DisplaySink(self.image)  # Reusable texture upload
+        self.username_label = MDLabel(text="Loading face model...", halign="center", font_style="H6")
         self.confidence_label = MDLabel(text="", halign="center", theme_text_color="Secondary")
         self.switch_camera_button = MDRaisedButton(text="Switch Camera", on_release=self.switch_camera)
 
@@ -40,101 +55,177 @@ class RecognitionScreen(Screen):
         self.layout.add_widget(self.username_label)
         self.layout.add_widget(self.confidence_label)
         self.layout.add_widget(self.switch_camera_button)
+        add_perf_overlay(self.layout, ("recognition", "db", "voice"))
         self.add_widget(self.layout)
 
-        # Load known faces from the database
-        self.known_faces = self.load_known_faces()
+        self.sync_event = None  # Polls for enrollments made by other processes
+        if RECOGNITION_SERVER:
+            # Thin client: the server owns the model and the gallery
+            self.client = RecognitionClient(RECOGNITION_SERVER)
+            self.gallery = None
+            self.username_label.text = "Detecting..."
+            return
+
+        # In-memory embedding matrix, refreshed when ManageFace changes the table
+        self.gallery = shared_gallery()
 
-    def load_known_faces(self):
-        """Load stored face data from the database"""
-        faces = manage_face()  # Fetch (id, name, relation, image_path)
-        known_faces = {}
-        for face in faces:
-            face_id, name, _, _ = face  # Store only ID and Name
-            known_faces[face_id] = name
-        return known_faces  # Returns {id: name} dictionary
+        when_model_ready(lambda model: Clock.schedule_once(lambda dt: self.on_model_ready(model)))
+
+    def on_model_ready(self, model):
+        """Start recognizing once the shared model has loaded"""
+        self.face_model = model
+        self.username_label.text = "Detecting..."
 
     def on_enter(self, *args):
         """Start camera when entering the screen"""
         self.start_capture()
 
     def start_capture(self):
-        """Check if camera is already open before starting a new session."""
-        self.capture = cv2.VideoCapture(current_camera)
-        if not self.capture.isOpened():
+        """Open the camera and start the capture and inference threads."""
+        self.stop_capture()
+        self.pipeline = FramePipeline(cv2.VideoCapture(current_camera), self.process_frame,
+                                      name="recognition")
+        if not self.pipeline.isOpened():
+            self.pipeline.stop()
+            self.pipeline = None
             self.username_label.text = "Error: Unable to access camera"
             return
 
-        Clock.schedule_interval(self.update_frame, 1.0 / 60)
-
-    def update_frame(self, dt):
-        """Process real-time face recognition"""
-        ret, frame = self.capture.read()
-        if not ret:
-            return
-
-        faces = app.get(frame)  # Detect faces using ArcFace
-
-        detected_name = "Unknown"
-        confidence_score = 0.0
-
-        for face in faces:
-            x, y, w, h = face.bbox.astype(int)  # Get face bounding box
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)  # Draw a rectangle around the face
-
-            # Extract facial features
-            new_face = face.normed_embedding
-
-            # Compare with known faces
-            detected_name, confidence_score = self.find_best_match(new_face)
+        self.rendered_id = 0
+        self.tracker = None
+        self.pipeline.start()
+        self.clock_event = Clock.schedule_interval(self.update_frame, 1.0 / 60)
+        if self.gallery is not None:
+            self.sync_event = Clock.schedule_interval(self.sync_gallery, SYNC_INTERVAL)
+
+    def stop_capture(self):
+        """Stop the pipeline threads and release the camera"""
+        if self.clock_event:
+            self.clock_event.cancel()
+            self.clock_event = None
+        if self.sync_event:
+            self.sync_event.cancel()
+            self.sync_event = None
+        if self.pipeline:
+            self.pipeline.stop()
+            self.pipeline = None
+
+    def process_frame(self, frame):
+        """Recognize faces in a frame (runs on the inference worker thread)"""
+        if RECOGNITION_SERVER:
+            bboxes, matches = self.recognize_remote(frame)
+            if matches is None:
+                return frame, None  # Server unreachable, show the raw camera feed
+            return self.draw_matches(frame, bboxes, matches), matches
+
+        if self.face_model is None:
+            return frame, None  # Model still loading, show the raw camera feed
+
+        if TRACKING_MODE and self.tracker is None:
+            self.tracker = FaceTracker(self.face_model, partial(self.gallery.match_batch, relations=True))
+
+        if self.tracker:
+            # Tracks carry their last recognition result between detections
+            with metrics.timer("recognition.track"):
+                tracks = self.tracker.update(frame)
+            bboxes = [track.bbox for track in tracks]
+            matches = [track.matches for track in tracks]
+        else:
+            with metrics.timer("recognition.detect_embed"):
+                faces = analyze_faces(self.face_model, frame)  # Detect + ArcFace only
+            bboxes = [face.bbox for face in faces]
+            # Match every face in the frame against the gallery in one pass
+            with metrics.timer("recognition.match"):
+                matches = self.find_best_matches([face.normed_embedding for face in faces])
+
+        return self.draw_matches(frame, bboxes, matches), matches
+
+    def recognize_remote(self, frame):
+        """Recognize a frame on RECOGNITION_SERVER; returns (bboxes, matches).
+
+        matches is None while the server is unreachable.
+        """
+        with metrics.timer("recognition.remote"):
+            faces = self.client.recognize(frame)
+        if faces is None:
+            return [], None
+        bboxes = [np.asarray(face["bbox"], dtype=np.float32) for face in faces]
+        matches = [[(face["name"], face["score"], face.get("relation", ""))] for face in faces]
+        return bboxes, matches
+
+    def draw_matches(self, frame, bboxes, matches):
+        """Draw each face's box and best match onto the frame"""
+        for bbox, face_matches in zip(bboxes, matches):
+            x1, y1, x2, y2 = bbox.astype(int)  # Get face bounding box
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)  # Draw a rectangle around the face
 
             # Display recognition results
-            cv2.putText(frame, f"{detected_name} ({confidence_score:.2f}%)", (x, y - 10),
+            detected_name, confidence_score = face_matches[0][:2]
+            cv2.putText(frame, f"{detected_name} ({confidence_score:.2f}%)", (x1, y1 - 10),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 0, 0), 2)
+        return frame
 
-        # Update UI labels
-        self.username_label.text = f"Detected: {detected_name}"
-        self.confidence_label.text = f"Confidence: {confidence_score:.2f}%"
+    def update_frame(self, dt):
+        """Render the newest recognized frame (runs on the UI thread)"""
+        result_id, result = self.pipeline.latest()
+        if result is None or result_id == self.rendered_id:
+            return
+        self.rendered_id = result_id
+        frame, matches = result
 
-        # Convert OpenCV frame to Kivy-compatible texture
-        buf = cv2.flip(frame, 0).tobytes()
-        texture = Texture.create(size=(frame.shape[1], frame.shape[0]), colorfmt='bgr')
-        texture.blit_buffer(buf, colorfmt='bgr', bufferfmt='ubyte')
-        self.image.texture = texture  # Update UI with the latest frame
+        # Update UI labels
+        if matches is None:
+            self.username_label.text = ("Recognition server unavailable" if RECOGNITION_SERVER
+                                        else "Loading face model...")
+            self.confidence_label.text = ""
+        elif matches:
+            self.username_label.text = "Detected: " + ", ".join(m[0][0] for m in matches)
+            self.confidence_label.text = "Confidence: " + ", ".join(f"{m[0][1]:.2f}%" for m in matches)
+            if VOICE_GREETINGS:
+                self.greet(matches)
+        else:
+            self.username_label.text = "Detected: Unknown"
+            self.confidence_label.text = "Confidence: 0.00%"
+
+        # Upload the frame into the reusable texture
+        with metrics.timer("recognition.render"):
+            self.display.show(frame)
+        metrics.tick("recognition.render_fps")
+
+    def sync_gallery(self, dt):
+        """Queue faces enrolled, edited or deleted by other processes (UI thread)"""
+        with metrics.timer("recognition.sync"):
+            self.gallery.sync()
+
+    def greet(self, matches):
+        """Queue a (usually pre-rendered) greeting for every recognized face.
+
+        Matches carry the relation, so the UI thread never touches the gallery.
+        """
+        voice_manager = getattr(MDApp.get_running_app(), "voice_manager", None)
+        if voice_manager is None:
+            return
+        for face_matches in matches:
+            name = face_matches[0][0]
+            if name != "Unknown":
+                voice_manager.verification_success(name, face_matches[0][2])
 
     def find_best_match(self, new_face):
-        """Compare detected face with stored faces in the database"""
-        conn = sqlite3.connect("database.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, features FROM faces")
-        known_faces = cursor.fetchall()
-        conn.close()
-
-        best_match = "Unknown"
-        best_score = 0
-
-        for face_id, name, stored_features in known_faces:
-            stored_features = np.frombuffer(stored_features, dtype=np.float32)  # ✅ Ensure 512D
-            if stored_features.shape[0] != 512:
-                continue  # Skip invalid data
-
-            score = np.dot(new_face, stored_features) / (np.linalg.norm(new_face) * np.linalg.norm(stored_features))
-
-            if score > best_score:
-                best_score = score
-                best_match = name
+        """Compare detected face with the in-memory gallery of stored faces"""
+        return self.gallery.match(new_face)
 
-        return best_match if best_score > 0.6 else "Unknown", best_score * 100
+    def find_best_matches(self, new_faces, top_k=1):
+        """Match all faces of a frame at once; returns [(name, score%, relation), ...] per face"""
+        if len(new_faces) == 0:
+            return []
+        return self.gallery.match_batch(np.stack(new_faces), top_k, relations=True)
 
     def switch_camera(self, *args):
         """Switch between front and back cameras"""
         global current_camera
         current_camera = 1 - current_camera
-        self.capture.release()
         self.start_capture()
 
     def on_leave(self, *args):
         """Release camera resources when leaving the screen"""
-        if self.capture:
-            self.capture.release()
-            Clock.unschedule(self.update_frame)
+        self.stop_capture()
@@ -0,0 +1,227 @@
+"""Local HTTP face recognition service with micro-batched embedding.
+
+POST /recognize with an encoded image (JPEG/PNG) as the body returns
+    {"faces": [{"bbox": [x1, y1, x2, y2], "name": "Alice", "relation": "Friend", "score": 87.5}]}
+POST /recognize_crops with aligned face crops (112x112 from face_align.norm_crop)
+stacked vertically into one encoded image skips detection and returns
+one {"name", "relation", "score"} per crop, top to bottom.
+GET /health returns {"status": "ok", "people": <gallery size>}
+
+Detection runs on each request's thread. The aligned crops of all
+requests arriving within --window-ms are embedded together in one
+recognizer call, which keeps the CPU busy with large batches when many
+clients (cameras, kiosks) share one model. Request threads share one
+FaceGallery, whose methods are thread-safe.
+
+Usage: python RecognitionServer.py [--host 127.0.0.1] [--port 8765] [--window-ms 5] [--max-batch 32]
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+import ManageFace
+from utils import face_model
+from utils.embedding_codec import normalize
+from utils.face_gallery import FaceGallery, SYNC_INTERVAL
+from utils.perf_metrics import metrics
+
+DEFAULT_PORT = 8765
+BATCH_WINDOW = 0.005  # Seconds the batcher waits for more crops after the first
+MAX_BATCH = 32  # Crops per recognizer call
+MAX_BODY = 10 * 2 ** 20  # Largest accepted image upload (bytes)
+
+
+class EmbeddingBatcher:
+    """Collects aligned crops from many threads and embeds them in batches"""
+
+    def __init__(self, recognizer, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.recognizer = recognizer
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def embed(self, crops):
+        """Return normalized (n, 512) embeddings for crops (blocks until batched)"""
+        if not crops:
+            return np.empty((0, 512), dtype=np.float32)
+        future = Future()
+        self._queue.put((crops, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.perf_counter() + self.window
+            while size < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            crops = [crop for item_crops, _ in batch for crop in item_crops]
+            try:
+                with metrics.timer("server.embed_batch"):
+                    embeddings = normalize(self.recognizer.get_feat(crops))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            metrics.count("server.batches")
+            metrics.count("server.embedded_faces", len(crops))
+
+            offset = 0
+            for item_crops, future in batch:
+                future.set_result(embeddings[offset:offset + len(item_crops)])
+                offset += len(item_crops)
+
+
+class RecognitionService:
+    """Detection, batched embedding and gallery matching behind the HTTP handler"""
+
+    def __init__(self, model, gallery, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.model = model
+        self.gallery = gallery
+        self.batcher = EmbeddingBatcher(model.models["recognition"], window, max_batch)
+
+    def recognize(self, frame):
+        """Return [{"bbox", "name", "relation", "score"}, ...] for one image"""
+        from insightface.utils import face_align
+
+        with metrics.timer("server.detect"):
+            bboxes, kpss = face_model.detect_faces(self.model, frame)
+        if len(bboxes) == 0 or kpss is None:
+            return []
+
+        image_size = self.crop_size
+        crops = [face_align.norm_crop(frame, landmark=kps, image_size=image_size) for kps in kpss]
+        faces = self.recognize_crops(crops)
+        for bbox, face in zip(bboxes, faces):
+            face["bbox"] = [round(float(v), 1) for v in bbox[:4]]
+        return faces
+
+    @property
+    def crop_size(self):
+        """Side of the aligned crops the recognizer expects"""
+        return self.model.models["recognition"].input_size[0]
+
+    def recognize_crops(self, crops):
+        """Return [{"name", "relation", "score"}, ...] for already aligned crops"""
+        embeddings = self.batcher.embed(crops)
+        with metrics.timer("server.match"):
+            matches = self.gallery.match_batch(embeddings, relations=True)
+
+        faces = []
+        for face_matches in matches:
+            name, score, relation = face_matches[0]
+            faces.append({"name": name, "relation": relation, "score": round(score, 2)})
+        return faces
+
+
+class RecognitionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so clients can stream frames over one connection
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "people": len(self.server.service.gallery)})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _reject_unread(self, status, message):
+        """Error reply before the body was read: close, or its bytes would parse as the next request"""
+        self.close_connection = True
+        self._send_json(status, {"error": message})
+
+    def do_POST(self):
+        if self.path not in ("/recognize", "/recognize_crops"):
+            self._reject_unread(404, "not found")
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length <= 0 or length > MAX_BODY:
+            self._reject_unread(413 if length > MAX_BODY else 400, "expected an image body")
+            return
+
+        frame = cv2.imdecode(np.frombuffer(self.rfile.read(length), dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            self._send_json(400, {"error": "could not decode image"})
+            return
+        service = self.server.service
+        try:
+            if self.path == "/recognize_crops":
+                size = service.crop_size
+                if frame.shape[1] != size or frame.shape[0] % size:
+                    self._send_json(400, {"error": f"expected {size}x{size} crops stacked vertically"})
+                    return
+                with metrics.timer("server.request"):
+                    faces = service.recognize_crops(list(frame.reshape(-1, size, size, 3)))
+            else:
+                with metrics.timer("server.request"):
+                    faces = service.recognize(frame)
+        except Exception as e:
+            traceback.print_exc()
+            self._send_json(500, {"error": f"recognition failed: {e}"})
+            return
+        self._send_json(200, {"faces": faces})
+
+    def log_message(self, format, *args):
+        pass  # One line per frame would flood the console
+
+
+def serve(host, port, window, max_batch):
+    model = face_model.get_model()
+    gallery = FaceGallery(sync_interval=SYNC_INTERVAL)  # Picks up enrollments from other processes
+    server = ThreadingHTTPServer((host, port), RecognitionHandler)
+    server.daemon_threads = True
+    server.service = RecognitionService(model, gallery, window, max_batch)
+    metrics.start_writer()  # No-op unless FACE_PERF=1
+    print(f"Serving face recognition on http://{host}:{port}/recognize")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        gallery.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--window-ms", type=float, default=BATCH_WINDOW * 1000,
+                        help="How long a batch waits for more faces")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--db", default=ManageFace.DB_PATH, help="Database file")
+    args = parser.parse_args()
+
+    ManageFace.DB_PATH = args.db
+    serve(args.host, args.port, args.window_ms / 1000.0, args.max_batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Headless recognition over a video file, stream URL, camera index or image folder.
+
+Writes one JSON object per frame:
+    {"frame": 12, "timestamp": 0.4, "source": "clip.mp4",
+     "faces": [{"bbox": [x1, y1, x2, y2], "name": "Alice", "score": 87.5}]}
+
+Usage: python RecognizeStream.py clip.mp4 -o results.jsonl [--every 2] [--tracking]
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import cv2
+
+import ManageFace
+from utils import face_model
+from utils.face_gallery import FaceGallery
+from utils.face_images import IMAGE_EXTENSIONS
+from utils.face_tracker import FaceTracker
+from utils.frame_pipeline import open_source
+_END = object()
+
+
+class _ReaderError:
+    """Carries an exception from the prefetch thread to the consumer"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def iter_frames(source, every=1):
+    """Yield (frame_index, timestamp_seconds, label, frame) from any supported source"""
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTENSIONS))
+        for index, name in enumerate(names[::every]):
+            path = os.path.join(source, name)
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield index * every, os.path.getmtime(path), path, frame
+        return
+
+    capture = open_source(source)
+    if not capture.isOpened():
+        raise OSError(f"Unable to open source: {source}")
+    index = 0
+    try:
+        while True:
+            if index % every:
+                if not capture.grab():  # Skip without decoding
+                    break
+            else:
+                ret, frame = capture.read()
+                if not ret:
+                    break
+                yield index, capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0, source, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def prefetch(frames, size=8):
+    """Decode frames on a background thread so decoding overlaps inference.
+
+    Errors raised by frames (e.g. an unopenable source) are re-raised here.
+    """
+    buffer = queue.Queue(maxsize=size)
+
+    def reader():
+        try:
+            for item in frames:
+                buffer.put(item)
+        except BaseException as e:
+            buffer.put(_ReaderError(e))
+        else:
+            buffer.put(_END)
+
+    threading.Thread(target=reader, daemon=True).start()
+    while True:
+        item = buffer.get()
+        if item is _END:
+            return
+        if isinstance(item, _ReaderError):
+            raise item.error
+        yield item
+
+
+def recognize(model, gallery, frame, tracker=None):
+    """Return [{"bbox", "name", "score"}, ...] for one frame"""
+    if tracker is not None:
+        tracks = tracker.update(frame)
+        bboxes = [track.bbox for track in tracks]
+        matches = [track.matches for track in tracks]
+    else:
+        faces = face_model.analyze_faces(model, frame)
+        bboxes = [face.bbox for face in faces]
+        matches = gallery.match_batch([face.normed_embedding for face in faces]) if faces else []
+
+    return [{"bbox": [round(float(v), 1) for v in bbox[:4]],
+             "name": face_matches[0][0],
+             "score": round(face_matches[0][1], 2)}
+            for bbox, face_matches in zip(bboxes, matches)]
+
+
+def run(source, output, every=1, tracking=False):
+    """Recognize every frame of source, writing JSONL to output; returns frames/s"""
+    model = face_model.get_model()
+    gallery = FaceGallery()
+    tracker = FaceTracker(model, gallery.match_batch) if tracking else None
+
+    start = time.perf_counter()
+    count = 0
+    for index, timestamp, label, frame in prefetch(iter_frames(source, every)):
+        result = {
+            "frame": index,
+            "timestamp": round(timestamp, 3),
+            "source": label,
+            "faces": recognize(model, gallery, frame, tracker),
+        }
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        count += 1
+    elapsed = time.perf_counter() - start
+    return count, count / max(elapsed, 1e-9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recognize faces in recorded footage")
+    parser.add_argument("source", help="Video file, stream URL, camera index or image folder")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("--every", type=int, default=1, help="Only process every Nth frame")
+    parser.add_argument("--tracking", action="store_true",
+                        help="Detect every few frames and track faces in between")
+    parser.add_argument("--db", default=ManageFace.DB_PATH, help="Database file")
+    args = parser.parse_args()
+
+    ManageFace.DB_PATH = args.db
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        count, fps = run(args.source, output, max(1, args.every), args.tracking)
+    except OSError as e:
+        raise SystemExit(str(e))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"Processed {count} frames at {fps:.1f} fps", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
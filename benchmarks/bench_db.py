@@ -0,0 +1,67 @@
+"""ManageFace database operations at scale.
+
+Usage: python benchmarks/bench_db.py [--sizes 1000 10000 100000] [--format int8]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from common import Timings, random_embeddings, use_database, write_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--format", default="float32", help="ManageFace.FEATURE_FORMAT to store")
+    parser.add_argument("--ops", type=int, default=200, help="Single-row operations per kind")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    results = []
+    rng = np.random.default_rng(2)
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            ManageFace = use_database(os.path.join(workdir, f"bench_{size}.db"))
+            ManageFace.FEATURE_FORMAT = args.format
+            embeddings = random_embeddings(size)
+            records = [(f"person_{i}", "bench", "assets/bench.png", vector)
+                       for i, vector in enumerate(embeddings)]
+
+            start = time.perf_counter()
+            ManageFace.save_faces_batch(records)
+            batch_seconds = time.perf_counter() - start
+
+            timings = Timings()
+            ids = rng.choice(np.arange(1, size + 1), min(args.ops, size), replace=False).tolist()
+            for i in range(min(args.ops, size)):
+                timings.time("save_face_data", ManageFace.save_face_data, *records[i])
+            for face_id in ids:
+                timings.time("get_face_by_id", ManageFace.get_face_by_id, face_id)
+                timings.time("update_face", ManageFace.update_face, face_id, "renamed", "bench")
+            timings.time("update_faces_batch", ManageFace.update_faces,
+                         [(face_id, "batched", "bench") for face_id in ids])
+            timings.time("manage_face", ManageFace.manage_face)
+            timings.time("load_face_features", ManageFace.load_face_features)
+            for face_id in ids[: len(ids) // 2]:
+                timings.time("delete_face", ManageFace.delete_face, face_id)
+            timings.time("delete_faces_batch", ManageFace.delete_faces, ids[len(ids) // 2:])
+
+            results.append({
+                "rows": size,
+                "format": args.format,
+                "batch_insert_rows_per_s": round(size / batch_seconds, 1),
+                "db_size_mb": round(sum(os.path.getsize(ManageFace.DB_PATH + suffix)
+                                        for suffix in ("", "-wal")
+                                        if os.path.exists(ManageFace.DB_PATH + suffix)) / 2 ** 20, 2),
+                "operations": timings.summary(),
+            })
+            ManageFace.close_connection()
+
+    write_results("db", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Gallery matching latency and memory on synthetic galleries.
+
+Usage: python benchmarks/bench_matching.py [--sizes 1000 10000 100000 1000000] [--ann]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from common import Timings, peak_rss_mb, random_embeddings, use_database, write_results
+
+
+def populate(ManageFace, embeddings):
+    """Insert embeddings as database.db rows; returns rows/s"""
+    start = time.perf_counter()
+    for offset in range(0, len(embeddings), 10000):
+        block = embeddings[offset:offset + 10000]
+        ManageFace.save_faces_batch([(f"person_{offset + i}", "bench", "assets/bench.png", vector)
+                                     for i, vector in enumerate(block)])
+    return len(embeddings) / (time.perf_counter() - start)
+
+
+def bench_gallery(gallery, queries, expected_rows, batch):
+    """Latency of single and batched matches plus top-1 agreement with expected_rows"""
+    timings = Timings()
+    found = []
+    for query in queries:
+        rows, _ = timings.time("match_single", gallery.search, query[None, :], 1)
+        found.append(rows[0, 0])
+    for start in range(0, len(queries) - batch + 1, batch):
+        timings.time(f"match_batch_{batch}", gallery.search, queries[start:start + batch], 1)
+    recall = float(np.mean(np.asarray(found) == expected_rows))
+    return timings.summary(), recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--formats", nargs="+", default=["float32", "float16", "int8"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=10, help="Faces per frame for batched matching")
+    parser.add_argument("--ann", action="store_true", help="Also benchmark the IVF index")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    from utils import face_gallery
+    from utils.face_gallery import FaceGallery
+
+    results = []
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            ManageFace = use_database(os.path.join(workdir, f"bench_{size}.db"))
+            embeddings = random_embeddings(size)
+            insert_rate = populate(ManageFace, embeddings)
+
+            # Queries are noisy copies of enrolled faces, like live captures
+            picks = rng.choice(size, min(args.queries, size), replace=False)
+            noise = rng.standard_normal((len(picks), embeddings.shape[1])).astype(np.float32)
+            queries = embeddings[picks] + 0.03 * noise
+            entry = {"gallery_size": size, "insert_rows_per_s": round(insert_rate, 1), "formats": {}}
+
+            for fmt in args.formats:
+                start = time.perf_counter()
+                gallery = FaceGallery(fmt=fmt, use_ann=False, use_snapshot=False)
+                gallery.refresh()
+                load_seconds = time.perf_counter() - start
+                # Fresh database: gallery row i holds embeddings[i]
+                latency, recall = bench_gallery(gallery, queries, picks, args.batch)
+                entry["formats"][fmt] = {
+                    "load_from_db_s": round(load_seconds, 3),
+                    "matrix_mb": round((gallery.matrix.nbytes + gallery.scales.nbytes) / 2 ** 20, 2),
+                    "top1_agreement": recall,
+                    "latency": latency,
+                }
+                gallery.close()
+
+                # Snapshot round trip: write once, then time the memory-mapped load
+                face_gallery.SNAPSHOT_MIN_SIZE = 0
+                writer = FaceGallery(fmt=fmt, use_ann=False)
+                writer.refresh()
+                writer.close()
+                start = time.perf_counter()
+                mapped = FaceGallery(fmt=fmt, use_ann=False)
+                mapped.refresh()
+                entry["formats"][fmt]["load_from_snapshot_s"] = round(time.perf_counter() - start, 3)
+                mapped.close()
+
+            if args.ann:
+                start = time.perf_counter()
+                gallery = FaceGallery(use_ann=True, use_snapshot=False)
+                gallery.refresh()
+                build_seconds = time.perf_counter() - start
+                latency, recall = bench_gallery(gallery, queries, picks, args.batch)
+                entry["ann"] = {
+                    "build_s": round(build_seconds, 3),
+                    "nlist": gallery.index.nlist,
+                    "nprobe": gallery.nprobe,
+                    "recall_at_1": recall,
+                    "latency": latency,
+                }
+                gallery.close()
+
+            entry["peak_rss_mb"] = peak_rss_mb()
+            results.append(entry)
+            ManageFace.close_connection()
+
+    write_results("matching", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Frame pipeline throughput and per-stage latency with a fake camera.
+
+Replays a clip (or random frames) through the recognition and enrollment
+paths on CPU; needs the insightface model but no camera or GPU.
+
+Usage: python benchmarks/bench_pipeline.py [--clip lobby.mp4] [--seconds 10] [--tracking]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+
+from common import Timings, peak_rss_mb, random_embeddings, use_database, write_results
+from fake_camera import FakeCamera
+
+
+def recognition_stages(model, gallery, timings):
+    """RecognitionScreen.process_frame split into timed stages"""
+    from utils.face_model import detect_faces, embed_faces
+
+    def process(frame):
+        start = time.perf_counter()
+        bboxes, kpss = timings.time("detect", detect_faces, model, frame)
+        matches = []
+        if len(bboxes) and kpss is not None:
+            embeddings = timings.time("embed", embed_faces, model, frame, kpss)
+            matches = timings.time("match", gallery.match_batch, embeddings)
+        for bbox in bboxes:
+            x1, y1, x2, y2 = bbox[:4].astype(int)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
+        timings.add("total", time.perf_counter() - start)
+        return frame, matches
+
+    return process
+
+
+def tracking_stages(model, gallery, timings):
+    """Recognition with the face tracker (detect every N frames)"""
+    from utils.face_tracker import FaceTracker
+
+    tracker = FaceTracker(model, gallery.match_batch)
+
+    def process(frame):
+        tracks = timings.time("track", tracker.update, frame)
+        return frame, [track.matches for track in tracks]
+
+    return process, tracker
+
+
+def enrollment_stages(model, timings):
+    """AddFaceScreen preview (detection only) and capture (detect + embed + crop)"""
+    from utils import face_images
+    from utils.face_model import analyze_faces, detect_faces, PREVIEW_DET_SIZE
+
+    def preview(frame):
+        return timings.time("preview_detect", detect_faces, model, frame, input_size=PREVIEW_DET_SIZE)
+
+    def capture(frame):
+        faces = timings.time("capture_analyze", analyze_faces, model, frame)
+        if faces:
+            crop = timings.time("crop", face_images.crop_face, frame, faces[0].bbox)
+            timings.time("sharpness", face_images.sharpness, crop)
+        return faces
+
+    return preview, capture
+
+
+def run_threaded(camera, process, seconds, render_hz=60):
+    """Drive FramePipeline like the UI thread does; returns throughput figures"""
+    from utils.frame_pipeline import FramePipeline
+
+    pipeline = FramePipeline(camera, process)
+    pipeline.start()
+    rendered, last_id = 0, 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        result_id, result = pipeline.latest()
+        if result is not None and result_id != last_id:
+            rendered += 1
+            last_id = result_id
+        time.sleep(1.0 / render_hz)
+    elapsed = time.perf_counter() - start
+    pipeline.stop()
+    return {
+        "camera_frames": pipeline.source.frame_id,
+        "processed_fps": round(pipeline.processed / elapsed, 2),
+        "rendered_fps": round(rendered / elapsed, 2),
+        "dropped_frames": pipeline.dropped,
+    }
+
+
+def run_sequential(camera, process, frames):
+    """Process frames back to back (no pacing) for the maximum inference rate"""
+    start = time.perf_counter()
+    for _ in range(frames):
+        ret, frame = camera.read()
+        if not ret:
+            break
+        process(frame)
+    return round(frames / (time.perf_counter() - start), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clip", default=None, help="Video to replay (default: random frames)")
+    parser.add_argument("--fps", type=float, default=30, help="Fake camera frame rate")
+    parser.add_argument("--seconds", type=float, default=10, help="Duration of each threaded run")
+    parser.add_argument("--frames", type=int, default=100, help="Frames for sequential runs")
+    parser.add_argument("--gallery-size", type=int, default=1000)
+    parser.add_argument("--tracking", action="store_true", help="Also benchmark tracking mode")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    from utils import face_model
+    from utils.face_gallery import FaceGallery
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        ManageFace = use_database(os.path.join(workdir, "bench.db"))
+        ManageFace.save_faces_batch([(f"person_{i}", "bench", "assets/bench.png", vector)
+                                     for i, vector in enumerate(random_embeddings(args.gallery_size))])
+        gallery = FaceGallery()
+
+        start = time.perf_counter()
+        model = face_model.get_model()
+        results["model_load_s"] = round(time.perf_counter() - start, 2)
+
+        timings = Timings()
+        process = recognition_stages(model, gallery, timings)
+        results["recognition"] = {
+            "sequential_fps": run_sequential(FakeCamera(args.clip, fps=None), process, args.frames),
+            "threaded": run_threaded(FakeCamera(args.clip, fps=args.fps), process, args.seconds),
+            "stages": timings.summary(),
+        }
+
+        if args.tracking:
+            timings = Timings()
+            process, tracker = tracking_stages(model, gallery, timings)
+            threaded = run_threaded(FakeCamera(args.clip, fps=args.fps), process, args.seconds)
+            results["tracking"] = {
+                "threaded": threaded,
+                "stages": timings.summary(),
+                "detections": tracker.detections,
+                "recognitions": tracker.recognitions,
+                "frames": tracker.frame_index,
+            }
+
+        timings = Timings()
+        preview, capture = enrollment_stages(model, timings)
+        results["enrollment"] = {
+            "preview_sequential_fps": run_sequential(FakeCamera(args.clip, fps=None), preview, args.frames),
+            "capture_sequential_fps": run_sequential(FakeCamera(args.clip, fps=None), capture, args.frames),
+            "stages": timings.summary(),
+        }
+
+        gallery.close()
+        ManageFace.close_connection()
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    write_results("pipeline", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
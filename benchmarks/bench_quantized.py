@@ -0,0 +1,111 @@
+"""Accuracy and speed of an INT8 model pack against the float one.
+
+Runs both packs over a labeled photo folder (<name>/*.jpg, as for
+BulkEnroll.py) and reports detection agreement, float-vs-int8 embedding
+cosine, pairwise same/different-person decisions at the gallery
+threshold, and per-image latency of each pack.
+
+Usage: python benchmarks/bench_quantized.py photos/ [--variant buffalo_s_int8] [--limit 500]
+"""
+import argparse
+
+import cv2
+import numpy as np
+
+from common import Timings, peak_rss_mb, write_results
+
+
+def extract(model, images, timings, stage):
+    """Top face (bbox, embedding) per image, or None where no face was found"""
+    from utils.face_model import detect_faces, embed_faces
+
+    results = []
+    for image in images:
+        bboxes, kpss = timings.time(f"{stage}.detect", detect_faces, model, image, max_num=1)
+        if len(bboxes) == 0 or kpss is None:
+            results.append(None)
+            continue
+        embedding = timings.time(f"{stage}.embed", embed_faces, model, image, kpss[:1])[0]
+        results.append((bboxes[0], embedding))
+    return results
+
+
+def pair_decisions(embeddings, labels, threshold):
+    """Same-person decisions and their correctness for every pair of images"""
+    sims = embeddings @ embeddings.T
+    upper = np.triu_indices(len(labels), k=1)
+    same = (labels[:, None] == labels[None, :])[upper]
+    decisions = sims[upper] > threshold
+    return decisions, {
+        "true_accept_rate": round(float(decisions[same].mean()), 4) if same.any() else None,
+        "false_accept_rate": round(float(decisions[~same].mean()), 4) if (~same).any() else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("photos", help="Labeled photo folder: <name>/*.jpg")
+    parser.add_argument("--reference", default="buffalo_s", help="Float model pack")
+    parser.add_argument("--variant", default="buffalo_s_int8", help="Quantized model pack")
+    parser.add_argument("--limit", type=int, default=500, help="Maximum photos used")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    from BulkEnroll import find_images
+    from utils import face_model
+    from utils.face_gallery import MATCH_THRESHOLD
+    from utils.face_tracker import iou_matrix
+
+    jobs = find_images(args.photos)[:args.limit]
+    labels, images = [], []
+    for name, path in jobs:
+        image = cv2.imread(path)
+        if image is not None:
+            labels.append(name)
+            images.append(image)
+
+    timings = Timings()
+    reference = extract(face_model._create_model(profile={}, name=args.reference), images, timings, "float")
+    variant = extract(face_model._create_model(profile={}, name=args.variant), images, timings, "int8")
+
+    # Only images where both packs found a face can be compared
+    both = [i for i, (a, b) in enumerate(zip(reference, variant)) if a is not None and b is not None]
+    ious = [float(iou_matrix(reference[i][0][None, :4], variant[i][0][None, :4])[0, 0]) for i in both]
+    ref_embeddings = np.stack([reference[i][1] for i in both]) if both else np.empty((0, 512))
+    var_embeddings = np.stack([variant[i][1] for i in both]) if both else np.empty((0, 512))
+    cosines = np.sum(ref_embeddings * var_embeddings, axis=1)
+    pair_labels = np.asarray([labels[i] for i in both])
+
+    ref_decisions, ref_rates = pair_decisions(ref_embeddings, pair_labels, MATCH_THRESHOLD)
+    var_decisions, var_rates = pair_decisions(var_embeddings, pair_labels, MATCH_THRESHOLD)
+
+    stages = timings.summary()
+    speedup = {stage: round(stages[f"float.{stage}"]["mean_ms"] / stages[f"int8.{stage}"]["mean_ms"], 2)
+               for stage in ("detect", "embed")
+               if f"float.{stage}" in stages and f"int8.{stage}" in stages}
+
+    write_results("quantized", {
+        "reference": args.reference,
+        "variant": args.variant,
+        "images": len(images),
+        "faces_float": sum(r is not None for r in reference),
+        "faces_int8": sum(v is not None for v in variant),
+        "compared": len(both),
+        "bbox_iou_mean": round(float(np.mean(ious)), 4) if ious else None,
+        "embedding_cosine": {
+            "mean": round(float(cosines.mean()), 4) if len(both) else None,
+            "min": round(float(cosines.min()), 4) if len(both) else None,
+        },
+        "threshold": MATCH_THRESHOLD,
+        "decision_agreement": round(float(np.mean(ref_decisions == var_decisions)), 4)
+        if len(ref_decisions) else None,
+        "float_pairs": ref_rates,
+        "int8_pairs": var_rates,
+        "speedup": speedup,
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
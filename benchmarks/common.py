@@ -0,0 +1,108 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Make the repository modules importable when run as `python benchmarks/<name>.py`
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+class Timings:
+    """Collects per-stage durations and summarizes them in milliseconds"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def time(self, stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.add(stage, time.perf_counter() - start)
+        return result
+
+    def summary(self):
+        return {stage: summarize(values) for stage, values in self.samples.items()}
+
+
+def summarize(seconds):
+    """mean/p50/p95/p99/max in milliseconds for a list of durations"""
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    if ms.size == 0:
+        return {"count": 0}
+    return {
+        "count": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "max_ms": round(float(ms.max()), 4),
+    }
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (None where unsupported)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def environment():
+    """Machine and code version, so results from different runs can be compared"""
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "git_revision": revision,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def write_results(name, results, output=None):
+    """Print results and write them as JSON (default: benchmarks/results/<name>.json)"""
+    report = {"benchmark": name, "environment": environment(), "results": results}
+    if output is None:
+        output = os.path.join(REPO_ROOT, "benchmarks", "results", f"{name}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+
+
+def random_embeddings(count, dim=512, seed=0):
+    """Unit-norm random embeddings, generated in chunks to bound memory"""
+    rng = np.random.default_rng(seed)
+    out = np.empty((count, dim), dtype=np.float32)
+    for start in range(0, count, 65536):
+        block = rng.standard_normal((min(65536, count - start), dim), dtype=np.float32)
+        out[start:start + len(block)] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return out
+
+
+def use_database(path):
+    """Point ManageFace at a fresh database file"""
+    import ManageFace
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    ManageFace.close_connection()
+    ManageFace.DB_PATH = path
+    return ManageFace
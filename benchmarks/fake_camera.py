@@ -0,0 +1,66 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class FakeCamera:
+    """cv2.VideoCapture stand-in that replays a recorded clip.
+
+    Frames are decoded once into memory and served in a loop, paced to
+    ``fps`` (None = as fast as they are read). Without a clip, random
+    frames of ``size`` are generated so the pipeline still runs.
+    """
+
+    def __init__(self, clip=None, fps=30, size=(640, 480), max_frames=300, loop=True):
+        self.fps = fps
+        self.loop = loop
+        self.frames = []
+        if clip:
+            capture = cv2.VideoCapture(clip)
+            while len(self.frames) < max_frames:
+                ret, frame = capture.read()
+                if not ret:
+                    break
+                self.frames.append(frame)
+            capture.release()
+        if not self.frames:
+            rng = np.random.default_rng(0)
+            self.frames = [rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+                           for _ in range(min(max_frames, 30))]
+        self.position = 0
+        self.opened = True
+        self._next_time = time.perf_counter()
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        if not self.opened or (not self.loop and self.position >= len(self.frames)):
+            return False, None
+        if self.fps:
+            # Block like a real camera until the next frame is due
+            delay = self._next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_time = max(self._next_time, time.perf_counter() - 1.0) + 1.0 / self.fps
+        frame = self.frames[self.position % len(self.frames)].copy()
+        self.position += 1
+        return True, frame
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_FPS:
+            self.fps = value
+        return True
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps or 0
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.frames[0].shape[1]
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.frames[0].shape[0]
+        return 0
+
+    def release(self):
+        self.opened = False
@@ -1,8 +1,5 @@
-import sqlite3
-from kivy.uix.scrollview import ScrollView
 from kivymd.app import MDApp
 from kivymd.uix.dialog import MDDialog
-from kivymd.uix.list import MDList, IconRightWidget, TwoLineAvatarIconListItem, ImageLeftWidget
 from kivymd.uix.screen import Screen
 from kivymd.uix.label import MDLabel
 from kivymd.uix.button import MDRaisedButton, MDFlatButton
@@ -12,12 +9,15 @@ from kivy.core.window import Window
 from kivymd.uix.navigationdrawer import MDNavigationDrawer
 from kivy.uix.screenmanager import ScreenManager
 from kivy.metrics import dp
-from ManageFace import init_db, manage_face, delete_face
+from kivy.clock import Clock
+from ManageFace import init_db, delete_face, get_face_by_id
+from FaceList import FaceListView
 from AddFace import AddFaceScreen
-from Recognition import RecognitionScreen
+from Recognition import RecognitionScreen, RECOGNITION_SERVER
 from helpers import screen_helper
-from insightface.app import FaceAnalysis
 from utils.voice_manager import VoiceManager
+from utils.face_model import load_model_async
+from utils.perf_metrics import metrics
 
 
 class MainScreen(Screen):
@@ -27,10 +27,9 @@ class MainScreen(Screen):
 class MyApp(MDApp):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.face_model = FaceAnalysis(name="buffalo_s")
-        self.face_model.prepare(ctx_id=-1)
         # 初始化语音管理器
         self.voice_manager = VoiceManager()
+        self.face_list = None  # Faces tab list while it is shown
 
     def build(self):
         """Initialize the app, set theme, load screens, and set default screen."""
@@ -40,6 +39,16 @@ class MyApp(MDApp):
         init_db()  # Ensure database is initialized
         return screen
 
+    def on_start(self):
+        """Load the face model in the background once the window is shown.
+
+        With a recognition server only enrollment needs the model, so it
+        is loaded when the add-face screen is first opened instead.
+        """
+        if not RECOGNITION_SERVER:
+            Clock.schedule_once(lambda dt: load_model_async(), 0)
+        metrics.start_writer()  # No-op unless FACE_PERF=1
+
     def go_home(self):
         """Return to the main screen and reset the content area."""
         main_screen = self.root.get_screen('main')
@@ -69,43 +78,23 @@ class MyApp(MDApp):
         """Display stored face records from the database."""
         self.clean_content()
 
-        faces = manage_face()  # Fetch data
-
-        if not faces:
-            self.root.get_screen('main').ids.content_area.add_widget(
-                MDLabel(text="No face data found.", halign="center", theme_text_color="Secondary")
-            )
+        # Virtualized list: rows are built only for what is on screen, pages load on scroll
+        face_list = FaceListView(on_delete=self.confirm_delete)
+        if not face_list.data:
+            self.show_no_faces()  # The first page came back empty
             return
+        self.face_list = face_list
+        self.root.get_screen('main').ids.content_area.add_widget(self.face_list)
 
-        # Create ScrollView and List
-        scroll_view = ScrollView()
-        md_list = MDList()
-
-        for face_id, name, relation, image_path in faces:
-            item = TwoLineAvatarIconListItem(text=name, secondary_text=relation)
-
-            # Use default avatar if no image is available
-            avatar = ImageLeftWidget(source=image_path if image_path else "assets/default_face.png")
-            item.add_widget(avatar)
-
-            # Add delete button
-            delete_btn = IconRightWidget(icon="delete")
-            delete_btn.bind(on_release=lambda x, fid=face_id: self.confirm_delete(fid))
-            item.ids._right_container.add_widget(delete_btn)
-
-            md_list.add_widget(item)
-
-        scroll_view.add_widget(md_list)
-        self.root.get_screen('main').ids.content_area.add_widget(scroll_view)
+    def show_no_faces(self):
+        self.root.get_screen('main').ids.content_area.add_widget(
+            MDLabel(text="No face data found.", halign="center", theme_text_color="Secondary")
+        )
 
     def confirm_delete(self, face_id):
         """Show confirmation dialog before deleting a face record."""
         # 获取要删除的人名
-        conn = sqlite3.connect("database.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM faces WHERE id=?", (face_id,))
-        name = cursor.fetchone()[0]
-        conn.close()
+        name = get_face_by_id(face_id)['name']
         
         # 构建确认消息
         confirm_text = f"Are you sure you want to delete {name}'s face?"
@@ -139,13 +128,17 @@ class MyApp(MDApp):
         self.voice_manager.speak(f"Deleted {name}'s face")
         delete_face(face_id)
         self.dialog.dismiss()
-        self.manage_face()
+        # 原地删除该行，无需重建整个列表
+        if self.face_list is not None and not self.face_list.remove_face(face_id):
+            self.clean_content()
+            self.show_no_faces()
 
     def clean_content(self):
         """Clear the main screen content area before updating."""
         main_screen = self.root.get_screen('main')
         content_area = main_screen.ids.content_area
         content_area.clear_widgets()
+        self.face_list = None
 
     def on_tab_press(self, tab_name):
         """Handle bottom navigation tab selection."""
@@ -0,0 +1,262 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from utils.embedding_codec import normalize
+
+DEFAULT_NPROBE = 8  # Inverted lists scanned per query (higher = better recall, slower)
+KMEANS_ITERATIONS = 10
+KMEANS_MAX_SAMPLES = 65536
+
+
+def index_path_for(db_path):
+    """Path of the persisted index that sits next to the database file"""
+    return os.path.splitext(db_path)[0] + ".ann.npz"
+
+
+def _top_k(scores, k):
+    """Indices of the k largest scores, best first"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+class IVFIndex:
+    """Inverted-file (IVF) approximate nearest-neighbour index for embeddings.
+
+    Vectors are clustered with spherical k-means; a query only scans the
+    ``nprobe`` lists whose centroids are closest to it. ``nprobe`` is the
+    recall/latency knob: ``nprobe == nlist`` is an exact search.
+    """
+
+    def __init__(self, dim=512, nprobe=DEFAULT_NPROBE):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.centroids = np.empty((0, dim), dtype=np.float32)
+        self.trained_size = 0
+        self.source_id = 0  # Caller-defined id of the data the index was built from (saved with it)
+        self._list_ids = []
+        self._list_vectors = []
+        self._id_to_list = {}
+
+    def __len__(self):
+        return len(self._id_to_list)
+
+    def __contains__(self, face_id):
+        return int(face_id) in self._id_to_list
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    @property
+    def is_trained(self):
+        return self.nlist > 0
+
+    def needs_retrain(self):
+        """True once the index has grown well past the size it was trained on"""
+        return len(self) > 4 * max(self.trained_size, 1)
+
+    def train(self, vectors, ids, nlist=None, seed=0):
+        """Cluster vectors into nlist inverted lists and add them all"""
+        vectors = normalize(vectors)
+        ids = np.asarray(ids, dtype=np.int64)
+        n = vectors.shape[0]
+        if nlist is None:
+            nlist = int(4 * np.sqrt(n))
+        nlist = max(1, min(nlist, n, 4096))
+
+        rng = np.random.default_rng(seed)
+        if n > KMEANS_MAX_SAMPLES:
+            sample = vectors[rng.choice(n, KMEANS_MAX_SAMPLES, replace=False)]
+        else:
+            sample = vectors
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            assign = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            # Reseed empty clusters with random samples
+            sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()))]
+            centroids = normalize(sums)
+
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.trained_size = n
+        self._list_ids = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self._list_vectors = [np.empty((0, self.dim), dtype=np.float32) for _ in range(nlist)]
+        self._id_to_list = {}
+
+        assign = self._assign(vectors, self.centroids)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+        for list_no in range(nlist):
+            rows = order[bounds[list_no]:bounds[list_no + 1]]
+            self._list_ids[list_no] = ids[rows]
+            self._list_vectors[list_no] = np.ascontiguousarray(vectors[rows])
+        for list_no, list_ids in enumerate(self._list_ids):
+            for face_id in list_ids.tolist():
+                self._id_to_list[face_id] = list_no
+
+    @staticmethod
+    def _assign(vectors, centroids, chunk=8192):
+        """Nearest centroid for each vector, computed in bounded-memory chunks"""
+        assign = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], chunk):
+            block = vectors[start:start + chunk] @ centroids.T
+            assign[start:start + chunk] = np.argmax(block, axis=1)
+        return assign
+
+    def add(self, face_id, vector):
+        """Insert (or replace) one vector without retraining"""
+        face_id = int(face_id)
+        if face_id in self._id_to_list:
+            self.remove(face_id)
+        vector = normalize(vector).reshape(1, self.dim)
+        list_no = int(np.argmax(self.centroids @ vector[0]))
+        self._list_ids[list_no] = np.append(self._list_ids[list_no], face_id)
+        self._list_vectors[list_no] = np.concatenate([self._list_vectors[list_no], vector])
+        self._id_to_list[face_id] = list_no
+
+    def remove(self, face_id):
+        """Delete one vector; unknown ids are ignored"""
+        list_no = self._id_to_list.pop(int(face_id), None)
+        if list_no is None:
+            return
+        keep = self._list_ids[list_no] != int(face_id)
+        self._list_ids[list_no] = self._list_ids[list_no][keep]
+        self._list_vectors[list_no] = self._list_vectors[list_no][keep]
+
+    def copy(self):
+        """Snapshot of the index; add()/remove() replace list arrays, so they are shared"""
+        other = IVFIndex(dim=self.dim, nprobe=self.nprobe)
+        other.centroids = self.centroids
+        other.trained_size = self.trained_size
+        other.source_id = self.source_id
+        other._list_ids = list(self._list_ids)
+        other._list_vectors = list(self._list_vectors)
+        other._id_to_list = dict(self._id_to_list)
+        return other
+
+    def items(self):
+        """(ids, vectors) of every indexed vector, list by list"""
+        if not self._list_ids:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.dim), dtype=np.float32)
+        return np.concatenate(self._list_ids), np.concatenate(self._list_vectors)
+
+    def search(self, query, top_k=1, nprobe=None):
+        """Return (ids, scores) of the top_k most similar vectors"""
+        query = normalize(query).reshape(self.dim)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probes = _top_k(self.centroids @ query, nprobe)
+
+        ids = [self._list_ids[p] for p in probes]
+        vectors = [self._list_vectors[p] for p in probes]
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids = np.concatenate(ids)
+        scores = np.concatenate(vectors) @ query
+        best = _top_k(scores, top_k)
+        return ids[best], scores[best]
+
+    def save(self, path):
+        """Persist the index as a single .npz file (atomically, via a unique temp file)"""
+        sizes = np.array([len(ids) for ids in self._list_ids], dtype=np.int64)
+        ids, vectors = self.items()
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                        dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, centroids=self.centroids, sizes=sizes, ids=ids, vectors=vectors,
+                         trained_size=np.int64(self.trained_size), source_id=np.int64(self.source_id))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path, nprobe=DEFAULT_NPROBE):
+        """Load an index written by save()"""
+        with np.load(path) as data:
+            index = cls(dim=data["centroids"].shape[1], nprobe=nprobe)
+            index.centroids = data["centroids"]
+            index.trained_size = int(data["trained_size"])
+            index.source_id = int(data["source_id"]) if "source_id" in data.files else 0
+            bounds = np.concatenate([[0], np.cumsum(data["sizes"])])
+            ids, vectors = data["ids"], data["vectors"]
+        for list_no in range(index.nlist):
+            start, end = bounds[list_no], bounds[list_no + 1]
+            index._list_ids.append(ids[start:end].copy())
+            index._list_vectors.append(np.ascontiguousarray(vectors[start:end]))
+            for face_id in index._list_ids[-1].tolist():
+                index._id_to_list[face_id] = list_no
+        return index
+
+
+def measure_recall(index, vectors, ids, queries, top_k=1, nprobe=None):
+    """Compare index.search() with exact search; return (recall, ms/query)"""
+    vectors = normalize(vectors)
+    queries = normalize(queries)
+    ids = np.asarray(ids, dtype=np.int64)
+
+    hits = 0
+    elapsed = 0.0
+    for query in queries:
+        exact = set(ids[_top_k(vectors @ query, top_k)].tolist())
+        start = time.perf_counter()
+        found, _ = index.search(query, top_k, nprobe=nprobe)
+        elapsed += time.perf_counter() - start
+        hits += len(exact.intersection(found.tolist()))
+
+    total = max(len(queries) * min(top_k, len(ids)), 1)
+    return hits / total, 1000 * elapsed / max(len(queries), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check ANN recall against exact search")
+    parser.add_argument("--db", default=None, help="Use the embeddings stored in this database")
+    parser.add_argument("--synthetic", type=int, default=100000,
+                        help="Number of random embeddings when --db is not given")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=1)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.db:
+        import ManageFace
+        ManageFace.DB_PATH = args.db
+        rows = [(face_id, vector) for face_id, _, _, vector in ManageFace.load_face_features()
+                if vector.shape[0] == 512]
+        ids = np.array([face_id for face_id, _ in rows], dtype=np.int64)
+        vectors = normalize(np.vstack([vector for _, vector in rows]))
+    else:
+        # Clustered synthetic data behaves more like real identities than uniform noise
+        centers = normalize(rng.standard_normal((max(args.synthetic // 100, 1), 512)))
+        labels = rng.integers(0, centers.shape[0], args.synthetic)
+        vectors = normalize(centers[labels] + 0.5 * normalize(rng.standard_normal((args.synthetic, 512))))
+        ids = np.arange(1, args.synthetic + 1, dtype=np.int64)
+
+    # Queries are noisy copies of enrolled embeddings, like live captures
+    picks = rng.choice(len(ids), min(args.queries, len(ids)), replace=False)
+    queries = normalize(vectors[picks] + 0.3 * normalize(rng.standard_normal((len(picks), 512))))
+
+    start = time.perf_counter()
+    index = IVFIndex()
+    index.train(vectors, ids)
+    print(f"trained {index.nlist} lists over {len(ids)} vectors in {time.perf_counter() - start:.1f}s")
+
+    for nprobe in args.nprobe:
+        recall, latency = measure_recall(index, vectors, ids, queries, args.top_k, nprobe)
+        print(f"nprobe={nprobe:<4d} recall@{args.top_k}={recall:.4f}  {latency:.3f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import numpy as np
+from kivy.graphics.texture import Texture
+
+
+class DisplaySink:
+    """Uploads BGR frames into a Kivy Image without per-frame allocations.
+
+    One texture is kept per resolution and flipped once through its UV
+    coordinates, so OpenCV's top-down rows are shown upright without a
+    cv2.flip copy. Contiguous frames are blitted directly; others are
+    first copied into a preallocated buffer.
+    """
+
+    def __init__(self, image):
+        self.image = image
+        self._textures = {}  # (width, height) -> Texture
+        self._buffer = None
+
+    def show(self, frame):
+        """Display a BGR uint8 frame"""
+        height, width = frame.shape[:2]
+        texture = self._textures.get((width, height))
+        if texture is None:
+            texture = Texture.create(size=(width, height), colorfmt='bgr')
+            texture.flip_vertical()
+            self._textures[(width, height)] = texture
+
+        if not frame.flags.c_contiguous or frame.dtype != np.uint8:
+            if self._buffer is None or self._buffer.shape != frame.shape:
+                self._buffer = np.empty(frame.shape, dtype=np.uint8)
+            np.copyto(self._buffer, frame, casting='unsafe')
+            frame = self._buffer
+
+        texture.blit_buffer(frame.reshape(-1), colorfmt='bgr', bufferfmt='ubyte')
+        if self.image.texture is not texture:
+            self.image.texture = texture
+        else:
+            self.image.canvas.ask_update()
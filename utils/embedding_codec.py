@@ -0,0 +1,68 @@
+import numpy as np
+
+# Supported on-disk / in-memory embedding formats
+FORMATS = ("float32", "float16", "int8")
+
+
+def normalize(vectors):
+    """L2-normalize vectors along the last axis"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def quantize(vectors, fmt):
+    """Convert an (n, d) float matrix to fmt; returns (matrix, scales).
+
+    int8 stores each row as round(x / scale) with a per-row scale of
+    max|x| / 127; float formats use a scale of 1.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if fmt == "float32":
+        return np.ascontiguousarray(vectors), np.ones(len(vectors), dtype=np.float32)
+    if fmt == "float16":
+        return np.ascontiguousarray(vectors.astype(np.float16)), np.ones(len(vectors), dtype=np.float32)
+    if fmt == "int8":
+        scales = np.max(np.abs(vectors), axis=-1) / 127.0
+        scales = np.maximum(scales, 1e-12).astype(np.float32)
+        matrix = np.clip(np.rint(vectors / scales[..., None]), -127, 127).astype(np.int8)
+        return np.ascontiguousarray(matrix), scales
+    raise ValueError(f"Unknown embedding format: {fmt}")
+
+
+def dequantize(matrix, scales):
+    """Inverse of quantize(); returns float32 vectors"""
+    return np.asarray(matrix, dtype=np.float32) * np.asarray(scales, dtype=np.float32)[..., None]
+
+
+def encode(features, fmt):
+    """Encode one embedding as (blob, scale) for storage in SQLite"""
+    matrix, scales = quantize(np.asarray(features, dtype=np.float32).reshape(1, -1), fmt)
+    return matrix.tobytes(), float(scales[0])
+
+
+def decode(blob, fmt, scale):
+    """Decode a blob written by encode() (or a legacy float32 blob)"""
+    fmt = fmt or "float32"
+    vector = np.frombuffer(blob, dtype=np.dtype(fmt))
+    if fmt == "float32":
+        return vector
+    return vector.astype(np.float32) * np.float32(scale if scale is not None else 1.0)
+
+
+def scores(matrix, scales, queries, chunk=16384):
+    """Dot products between gallery rows and queries, shape (n, m).
+
+    Works directly on float16/int8 matrices: rows are widened chunk by
+    chunk so the temporary float32 copy stays bounded.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    if matrix.dtype == np.float32:
+        out = matrix @ queries.T
+    else:
+        out = np.empty((matrix.shape[0], queries.shape[0]), dtype=np.float32)
+        for start in range(0, matrix.shape[0], chunk):
+            block = matrix[start:start + chunk].astype(np.float32)
+            out[start:start + chunk] = block @ queries.T
+    if scales is not None:
+        out *= scales[:, None]
+    return out
@@ -0,0 +1,61 @@
+import numpy as np
+
+DUPLICATE_THRESHOLD = 0.6  # Cosine above which two enrollments are likely the same person
+BLOCK_SIZE = 4096  # Rows per block in the similarity join (a block pair is BLOCK_SIZE² floats)
+
+
+def find_similar(gallery, embedding, threshold=DUPLICATE_THRESHOLD, top_k=3):
+    """Enrolled people resembling embedding, best first.
+
+    Returns [(face_id, name, relation, score), ...] with score in [-1, 1].
+    """
+    with gallery.lock:  # Rows stay valid while the gallery can't change
+        rows, scores = gallery.search(np.asarray(embedding, dtype=np.float32)[None, :], top_k)
+        return [(int(gallery.ids[row]), gallery.names[row], gallery.relations[row], float(score))
+                for row, score in zip(rows[0].tolist(), scores[0].tolist())
+                if row >= 0 and score >= threshold]
+
+
+def find_duplicate_pairs(matrix, threshold=DUPLICATE_THRESHOLD, block=BLOCK_SIZE):
+    """All (i, j, score) with i < j and cosine >= threshold among normalized rows.
+
+    A blocked self-join: the matrix is compared block against block with
+    one matrix product each, so memory stays at one block² of scores
+    however many rows there are.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    first, second, scores = [], [], []
+    for start_a in range(0, len(matrix), block):
+        block_a = matrix[start_a:start_a + block]
+        for start_b in range(start_a, len(matrix), block):
+            sims = block_a @ matrix[start_b:start_b + block].T
+            if start_a == start_b:
+                sims[np.tril_indices(len(sims), 0, sims.shape[1])] = -np.inf  # Each pair once, no self-matches
+            i, j = np.nonzero(sims >= threshold)
+            first.append(i + start_a)
+            second.append(j + start_b)
+            scores.append(sims[i, j])
+    if not scores:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return np.concatenate(first), np.concatenate(second), np.concatenate(scores)
+
+
+def group_pairs(count, first, second):
+    """Union-find over duplicate pairs; returns groups (lists of row indices) of 2+ rows"""
+    parent = list(range(count))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in zip(first.tolist(), second.tolist()):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[root_b] = root_a
+
+    groups = {}
+    for row in set(first.tolist()) | set(second.tolist()):
+        groups.setdefault(find(row), []).append(row)
+    return [sorted(rows) for rows in groups.values()]
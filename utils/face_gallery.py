@@ -0,0 +1,554 @@
+import glob
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import ManageFace
+from ManageFace import (load_face_features, load_face_templates, get_database_id, get_revision,
+                        get_change_seq, changes_since, data_version,
+                        add_change_listener, remove_change_listener)
+from utils import embedding_codec
+from utils.ann_index import IVFIndex, DEFAULT_NPROBE, index_path_for
+
+EMBEDDING_DIM = 512  # ArcFace embedding size
+MATCH_THRESHOLD = 0.6  # Minimum cosine similarity for a known face
+ANN_MIN_SIZE = 20000  # Switch to the ANN index once the gallery is this large
+GALLERY_FORMAT = "float32"  # In-memory matrix format: "float32", "float16" or "int8"
+SNAPSHOT_MIN_SIZE = 1000  # Write a memory-mapped snapshot for galleries this large
+SYNC_INTERVAL = 0.5  # Seconds between checks for writes made by other processes
+ANN_CANDIDATES = 4  # ANN hits per requested match, re-ranked over all templates
+INDEX_MIN_COSINE = 0.99  # A persisted index is reused only if its vectors still match the gallery
+INDEX_SAVE_DELAY = 10.0  # Seconds after a change before the ANN index is written to disk
+RELOAD_FRACTION = 0.25  # Reload fully when more than this share of the gallery changed at once
+
+
+def _normalized(vector):
+    """Normalize a decoded embedding, or None if it is invalid"""
+    if vector is None or vector.shape[0] != EMBEDDING_DIM:
+        return None
+    return embedding_codec.normalize(vector)
+
+
+def _pack(vectors, fmt):
+    """Quantize normalized vectors to fmt, folding rounding error into the scales"""
+    matrix, scales = embedding_codec.quantize(vectors, fmt)
+    if fmt != "float32":
+        norms = np.linalg.norm(embedding_codec.dequantize(matrix, scales), axis=1)
+        scales = (scales / np.maximum(norms, 1e-12)).astype(np.float32)
+    return matrix, scales
+
+
+SNAPSHOT_ARRAYS = ("matrix", "ids", "counts", "scales")  # Memory-mapped .npy files of a snapshot
+
+
+def snapshot_paths(db_path):
+    """(array file prefix, metadata .json) paths of the snapshot next to the database"""
+    base = os.path.splitext(db_path)[0]
+    return base + ".gallery", base + ".gallery.json"
+
+
+def _snapshot_array_path(prefix, token, name):
+    return f"{prefix}.{token}.{name}.npy"
+
+
+def _write_atomic(path, write, mode="wb", **kwargs):
+    """Write a file through a unique temp file, so concurrent writers never interleave"""
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class FaceGallery:
+    """In-memory matrix of all enrolled face embeddings.
+
+    Embeddings are loaded once into a contiguous, L2-normalized matrix so
+    a match is a single matrix-vector product. Changes made through
+    ManageFace are queued and applied incrementally before the next match.
+
+    Each person owns a contiguous block of rows: the mean embedding first,
+    then its extra templates (ManageFace face_templates). A person's score
+    is the best score over its block, reduced with np.maximum.reduceat.
+
+    Writes from other processes are picked up by ``sync()``, which reads
+    the ManageFace changelog after a cheap PRAGMA data_version check.
+    Callers poll it (RecognitionScreen does so on a Clock) or pass
+    ``sync_interval`` to have matching check at most that often.
+    Screens of the app share one instance, see ``shared_gallery()``.
+
+    ``fmt`` selects a float32, float16 or int8 (per-row scale) matrix; the
+    matcher scores the compact form directly. The matrix is also saved as
+    a ``.npy`` snapshot next to the database and memory-mapped on the next
+    start while the database (its random id) and revision are unchanged.
+
+    Large galleries can use an IVF index (see utils.ann_index) instead of
+    the exact scan. ``use_ann=None`` enables it automatically from
+    ANN_MIN_SIZE faces; ``nprobe`` trades recall for latency.
+
+    Public methods are thread-safe: reloads and lookups share one lock, so
+    a match never sees half-applied changes.
+    """
+
+    def __init__(self, threshold=MATCH_THRESHOLD, use_ann=None, nprobe=DEFAULT_NPROBE,
+                 fmt=GALLERY_FORMAT, use_snapshot=True, sync_interval=None):
+        self.threshold = threshold
+        self.sync_interval = sync_interval
+        self.use_ann = use_ann
+        self.nprobe = nprobe
+        self.fmt = fmt
+        self.use_snapshot = use_snapshot
+        self.ids = np.empty(0, dtype=np.int64)
+        self.names = []
+        self.relations = []
+        self.counts = np.empty(0, dtype=np.int64)  # Template rows per person
+        self.matrix, self.scales = _pack(np.empty((0, EMBEDDING_DIM), dtype=np.float32), fmt)
+        self.index = None
+        self._index_dirty = False  # Index changed since it was last written
+        self._save_timer = None  # Pending debounced index write
+        self._starts = None
+
+        self._lock = threading.RLock()
+        self._dirty = True
+        self._pending = []
+        self._row_of = {}
+        self._seq = 0  # Newest ManageFace changelog entry applied
+        self._last_sync = 0.0
+        self._database_id = None  # ManageFace database id the gallery was loaded from
+        self._data_versions = {}  # Thread id -> last ManageFace.data_version() seen by sync()
+        add_change_listener(self._on_change)
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self.names)
+
+    def _on_change(self, op, face_id):
+        """ManageFace listener: queue the change for the next match"""
+        self._pending.append((op, face_id))
+
+    def sync(self):
+        """Queue changes committed by other processes; returns True if there were any.
+
+        Costs one PRAGMA query when nothing changed. Only the changed rows
+        are re-read, unless the changelog was pruned past our position.
+        Returns False without checking while another thread holds the
+        gallery (e.g. mid-reload), so a UI-thread poll never blocks.
+        """
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._last_sync = time.monotonic()
+            version = data_version()
+            thread = threading.get_ident()
+            changed = self._data_versions.get(thread) != version
+            self._data_versions[thread] = version
+            if self._dirty or not changed:
+                return False
+            seq, changes = changes_since(self._seq)
+            if changes is None:
+                self._dirty = True  # Too far behind, reload everything
+                return True
+            self._seq = seq
+            self._pending.extend(changes)
+            return bool(changes)
+        finally:
+            self._lock.release()
+
+    def _ensure_loaded(self):
+        if self.sync_interval is not None and time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+        if self._dirty:
+            self.refresh()
+        elif self._pending:
+            self._apply_changes()
+
+    def refresh(self):
+        """Reload every embedding from the snapshot or the database"""
+        with self._lock:
+            self._dirty = False
+            self._pending = []
+            self._seq = get_change_seq()  # Changes racing the load are re-applied harmlessly
+            database_id, revision = get_database_id(), get_revision()
+            self._database_id = database_id
+            if not (self.use_snapshot and self._load_snapshot(database_id, revision)):
+                self._load_database()
+                if self.use_snapshot and len(self.ids) >= SNAPSHOT_MIN_SIZE:
+                    self._save_snapshot(database_id, revision)
+            self._row_of = {face_id: row for row, face_id in enumerate(self.ids.tolist())}
+            self._starts = None
+            self._load_index()
+
+    @staticmethod
+    def _template_vectors(features, templates):
+        """Normalized [mean, *templates] rows of one person, or None if invalid"""
+        vector = _normalized(features)
+        if vector is None:
+            return None
+        vectors = [vector]
+        for template in templates:
+            template = _normalized(template)
+            if template is not None:
+                vectors.append(template)
+        return vectors
+
+    def _load_database(self):
+        templates = {}
+        for face_id, features in load_face_templates():
+            templates.setdefault(face_id, []).append(features)
+
+        ids, names, relations, counts, vectors = [], [], [], [], []
+        for face_id, name, relation, features in load_face_features():
+            rows = self._template_vectors(features, templates.get(face_id, ()))
+            if rows is None:
+                continue  # Skip invalid data
+            ids.append(face_id)
+            names.append(name)
+            relations.append(relation)
+            counts.append(len(rows))
+            vectors.extend(rows)
+
+        matrix = np.vstack(vectors) if vectors else np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.names = names
+        self.relations = relations
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.matrix, self.scales = _pack(matrix, self.fmt)
+
+    @property
+    def starts(self):
+        """First matrix row of every person"""
+        if self._starts is None:
+            self._starts = np.cumsum(self.counts) - self.counts
+        return self._starts
+
+    def _load_snapshot(self, database_id, revision):
+        """Memory-map the snapshot if it was written for this database at this revision"""
+        prefix, meta_path = snapshot_paths(ManageFace.DB_PATH)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if (meta["database_id"] != database_id or meta["revision"] != revision
+                    or meta["format"] != self.fmt):
+                return False
+            arrays = {name: np.load(_snapshot_array_path(prefix, meta["token"], name), mmap_mode="r")
+                      for name in SNAPSHOT_ARRAYS}
+            people = len(meta["names"])
+            if (arrays["ids"].shape != (people,) or arrays["counts"].shape != (people,)
+                    or len(meta["relations"]) != people
+                    or arrays["matrix"].shape != (int(arrays["counts"].sum()), EMBEDDING_DIM)
+                    or arrays["scales"].shape != (arrays["matrix"].shape[0],)):
+                return False
+        except (OSError, KeyError, ValueError):
+            return False
+
+        self.ids = arrays["ids"]
+        self.names = meta["names"]
+        self.relations = meta["relations"]
+        self.counts = arrays["counts"]
+        self.matrix = arrays["matrix"]
+        self.scales = arrays["scales"]
+        return True
+
+    def _save_snapshot(self, database_id, revision):
+        """Write the arrays as .npy files and names/relations as a JSON sidecar.
+
+        Every snapshot gets fresh array file names (a random token the
+        sidecar points to), so a process rewriting the snapshot never
+        mixes its arrays with another writer's.
+        """
+        prefix, meta_path = snapshot_paths(ManageFace.DB_PATH)
+        token = secrets.token_hex(8)
+        arrays = {"matrix": self.matrix, "ids": self.ids, "counts": self.counts, "scales": self.scales}
+        meta = {
+            "database_id": database_id,
+            "revision": revision,
+            "format": self.fmt,
+            "token": token,
+            "names": self.names,
+            "relations": self.relations,
+        }
+        try:
+            # Arrays first: a snapshot is only trusted once its metadata lands
+            for name, array in arrays.items():
+                _write_atomic(_snapshot_array_path(prefix, token, name), lambda f, a=array: np.save(f, a))
+            _write_atomic(meta_path, lambda f: json.dump(meta, f), "w", encoding="utf-8")
+        except OSError as e:
+            print(f"Failed to save gallery snapshot: {e}")
+            return
+        # Drop older snapshots (files still mapped elsewhere, e.g. on Windows, are left for next time)
+        for path in glob.glob(glob.escape(prefix) + "*.npy"):
+            if not os.path.basename(path).startswith(os.path.basename(prefix) + "." + token + "."):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _apply_changes(self):
+        """Apply queued inserts/updates/deletes without a full reload.
+
+        Changed faces are read in one query and merged into the matrix in a
+        single copy, so a bulk import costs one pass over the gallery rather
+        than one per face. Past RELOAD_FRACTION of the gallery a full
+        refresh() is cheaper and is used instead.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+            # A face changed several times (or seen via both listener and changelog) is re-read once
+            changed = list(dict.fromkeys(face_id for _, face_id in pending))
+            if len(changed) > RELOAD_FRACTION * len(self.names):
+                self.refresh()
+                return
+
+            faces = {face_id: (name, relation, features)
+                     for face_id, name, relation, features in load_face_features(changed)}
+            templates = {}
+            for face_id, features in load_face_templates(list(faces)):
+                templates.setdefault(face_id, []).append(features)
+
+            removed = []
+            added_ids, added_names, added_relations, added_counts = [], [], [], []
+            added_blocks, added_scales, added_means = [], [], []
+            for face_id in changed:
+                face = faces.get(face_id)
+                vectors = self._template_vectors(face[2], templates.get(face_id, ())) if face else None
+                row = self._row_of.get(face_id)
+                if vectors is not None:
+                    packed, scales = _pack(np.vstack(vectors), self.fmt)
+                    if row is not None:
+                        start, count = self.starts[row], self.counts[row]
+                        if count == len(packed) and np.array_equal(self.matrix[start:start + count], packed):
+                            self.names[row] = face[0]  # Only name/relation changed
+                            self.relations[row] = face[1]
+                            continue
+                    added_ids.append(face_id)
+                    added_names.append(face[0])
+                    added_relations.append(face[1])
+                    added_counts.append(len(packed))
+                    added_blocks.append(packed)
+                    added_scales.append(scales)
+                    added_means.append(vectors[0])
+                if row is not None:
+                    removed.append(row)  # Deleted, or its block moves to the end
+
+            if removed or added_ids:
+                keep = np.ones(len(self.ids), dtype=bool)
+                keep[removed] = False
+                keep_rows = np.repeat(keep, self.counts)
+                if self.index is not None:
+                    for face_id in self.ids[~keep].tolist():
+                        self.index.remove(face_id)
+                    for face_id, mean in zip(added_ids, added_means):
+                        self.index.add(face_id, mean)
+                self.ids = np.concatenate([self.ids[keep], np.asarray(added_ids, dtype=np.int64)])
+                self.names = [name for name, kept in zip(self.names, keep.tolist()) if kept] + added_names
+                self.relations = ([relation for relation, kept in zip(self.relations, keep.tolist()) if kept]
+                                  + added_relations)
+                self.counts = np.concatenate([self.counts[keep], np.asarray(added_counts, dtype=np.int64)])
+                self.matrix = np.concatenate([self.matrix[keep_rows], *added_blocks])
+                self.scales = np.concatenate([self.scales[keep_rows], *added_scales])
+                self._row_of = {face_id: row for row, face_id in enumerate(self.ids.tolist())}
+                self._starts = None
+
+            if self.index is not None:
+                if self.index.needs_retrain():
+                    self._build_index()
+                self._save_index()
+            elif self._wants_index():
+                self._load_index()
+
+    def _wants_index(self):
+        if self.use_ann is None:
+            return len(self.names) >= ANN_MIN_SIZE
+        return bool(self.use_ann) and len(self.names) > 0
+
+    def _load_index(self):
+        """Use the persisted ANN index if it matches the gallery, else rebuild it.
+
+        The index must come from this database (same database id) and
+        hold the current mean vector of exactly the gallery's people.
+        """
+        self.index = None
+        if not self._wants_index():
+            return
+        path = index_path_for(ManageFace.DB_PATH)
+        if os.path.exists(path):
+            try:
+                index = IVFIndex.load(path, nprobe=self.nprobe)
+                if index.source_id == self._database_id and self._index_matches(index):
+                    self.index = index
+                    self._index_dirty = False
+                    return
+            except (OSError, KeyError, ValueError) as e:
+                print(f"Rebuilding ANN index: {e}")
+        self._build_index()
+        self._save_index()
+
+    def _index_matches(self, index, chunk=65536):
+        """True if index holds each person's current mean (in bounded-memory chunks)"""
+        if len(index) != len(self.ids):
+            return False
+        ids, vectors = index.items()
+        rows = np.asarray([self._row_of.get(face_id, -1) for face_id in ids.tolist()], dtype=np.int64)
+        if len(rows) and rows.min() < 0:
+            return False
+        for start in range(0, len(rows), chunk):
+            mean_rows = self.starts[rows[start:start + chunk]]
+            means = embedding_codec.dequantize(self.matrix[mean_rows], self.scales[mean_rows])
+            means = embedding_codec.normalize(means)
+            if np.einsum("ij,ij->i", means, vectors[start:start + chunk]).min() < INDEX_MIN_COSINE:
+                return False
+        return True
+
+    def _build_index(self):
+        self.index = IVFIndex(dim=EMBEDDING_DIM, nprobe=self.nprobe)
+        self.index.source_id = self._database_id
+        # The index holds each person's mean; search() re-ranks hits over all templates
+        means = embedding_codec.dequantize(self.matrix[self.starts], self.scales[self.starts])
+        self.index.train(means, self.ids)
+
+    def _save_index(self):
+        """Write the index INDEX_SAVE_DELAY seconds from now, on a timer thread.
+
+        Changes made in between share one write, and matching never waits
+        for the (large) file to be written.
+        """
+        self._index_dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(INDEX_SAVE_DELAY, self._flush_index)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _flush_index(self):
+        with self._lock:
+            self._save_timer = None
+            if not self._index_dirty or self.index is None:
+                return
+            self._index_dirty = False
+            index = self.index.copy()  # Written outside the lock
+        try:
+            index.save(index_path_for(ManageFace.DB_PATH))
+        except OSError as e:
+            print(f"Failed to save ANN index: {e}")
+
+    def search(self, embeddings, top_k=1):
+        """Return (rows, scores) of the top_k gallery entries per embedding.
+
+        Both arrays have shape (n_faces, k), best first; rows index
+        self.ids/self.names and are -1 where the ANN index found fewer hits.
+        Rows are only valid until the next change: read ids/names under
+        ``with gallery.lock`` around the call.
+        """
+        with self._lock:
+            return self._search(embeddings, top_k)
+
+    @property
+    def lock(self):
+        """The gallery lock (re-entrant), for reading rows returned by search()"""
+        return self._lock
+
+    def _search(self, embeddings, top_k):
+        self._ensure_loaded()
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        queries = embedding_codec.normalize(queries)
+        k = min(top_k, len(self.names))
+
+        if k == 0:
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+
+        if self.index is not None:
+            rows = np.full((len(queries), k), -1, dtype=np.int64)
+            scores = np.full((len(queries), k), -1.0, dtype=np.float32)
+            for i, query in enumerate(queries):
+                found, _ = self.index.search(query, k * ANN_CANDIDATES)
+                found_rows = np.asarray([self._row_of[face_id] for face_id in found.tolist()], dtype=np.int64)
+                found_scores = self._person_scores(found_rows, query)
+                order = np.argsort(-found_scores)[:k]
+                rows[i, :len(order)] = found_rows[order]
+                scores[i, :len(order)] = found_scores[order]
+            return rows, scores
+
+        # One matrix-matrix product for every template and every face in the frame
+        scales = None if self.matrix.dtype == np.float32 else self.scales
+        sims = embedding_codec.scores(self.matrix, scales, queries)
+        if len(self.matrix) > len(self.names):
+            sims = np.maximum.reduceat(sims, self.starts, axis=0)  # Best template per person
+        sims = sims.T
+        if k == 1:
+            rows = np.argmax(sims, axis=1)[:, None]
+        else:
+            rows = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            order = np.argsort(-np.take_along_axis(sims, rows, axis=1), axis=1)
+            rows = np.take_along_axis(rows, order, axis=1)
+        return rows, np.take_along_axis(sims, rows, axis=1)
+
+    def _person_scores(self, rows, query):
+        """Best template score of each person in rows for a single query"""
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.float32)
+        counts = self.counts[rows]
+        offsets = np.cumsum(counts) - counts
+        template_rows = np.repeat(self.starts[rows] - offsets, counts) + np.arange(counts.sum())
+        scales = None if self.matrix.dtype == np.float32 else self.scales[template_rows]
+        sims = embedding_codec.scores(self.matrix[template_rows], scales, query[None, :])[:, 0]
+        return np.maximum.reduceat(sims, offsets)
+
+    def match_batch(self, embeddings, top_k=1, relations=False):
+        """Return a [(name, score%), ...] list per embedding, best first.
+
+        Only candidates above the threshold are listed; a face with none
+        gets [("Unknown", best_score%)]. With relations=True every entry is
+        (name, score%, relation) instead ("" for Unknown).
+        """
+        with self._lock:
+            rows, scores = self._search(embeddings, top_k)
+            results = []
+            for face_rows, face_scores in zip(rows.tolist(), scores.tolist()):
+                matches = [(self.names[row], score * 100, self.relations[row]) if relations
+                           else (self.names[row], score * 100)
+                           for row, score in zip(face_rows, face_scores)
+                           if row >= 0 and score > self.threshold]
+                if not matches:
+                    best_score = max(face_scores[0], 0.0) if face_scores else 0.0
+                    matches = [("Unknown", best_score * 100, "") if relations else ("Unknown", best_score * 100)]
+                results.append(matches)
+            return results
+
+    def match(self, embedding):
+        """Return (name, score%) of the closest enrolled face"""
+        return self.match_batch([embedding])[0][0]
+
+    def close(self):
+        """Stop listening for database changes and write any pending index"""
+        remove_change_listener(self._on_change)
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+        if timer is not None:
+            timer.cancel()
+            self._flush_index()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_gallery():
+    """The process-wide gallery used by the app's screens (created on first use).
+
+    Recognition and the enrollment duplicate check match against the same
+    matrix (and ANN index) instead of each loading its own copy.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = FaceGallery(sync_interval=SYNC_INTERVAL)
+        return _shared
@@ -0,0 +1,68 @@
+import os
+import threading
+
+import cv2
+
+SAVED_DIR = "saved_faces"
+ASSETS_DIR = "assets"
+CROP_SIZE = (256, 256)
+CROP_MARGIN = 0.2  # 扩大裁剪区域（20%边距）
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+_next_id = None
+_id_lock = threading.Lock()
+
+
+def sharpness(image):
+    """ Laplacian variance of an image; higher means sharper """
+    return cv2.Laplacian(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), cv2.CV_64F).var()
+
+
+def crop_face(image, bbox):
+    """ Crop a face with a margin around bbox (x1, y1, x2, y2) and resize it """
+    if bbox is None:
+        return image  # 如果没检测到人脸，使用原图
+
+    x1, y1, x2, y2 = [int(v) for v in bbox[:4]]
+    h, w = y2 - y1, x2 - x1
+    margin_h = int(h * CROP_MARGIN)
+    margin_w = int(w * CROP_MARGIN)
+
+    # 确保边界不超出图像范围
+    y1 = max(0, y1 - margin_h)
+    y2 = min(image.shape[0], y2 + margin_h)
+    x1 = max(0, x1 - margin_w)
+    x2 = min(image.shape[1], x2 + margin_w)
+
+    # 裁剪并调整大小
+    return cv2.resize(image[y1:y2, x1:x2], CROP_SIZE)
+
+
+def _allocate_id():
+    """ Next free face_<n>.png number (directory is listed only once per process) """
+    global _next_id
+    with _id_lock:
+        if _next_id is None:
+            _next_id = len(os.listdir(SAVED_DIR)) + 1
+        while (os.path.exists(f"{SAVED_DIR}/face_{_next_id}.png")
+               or os.path.exists(f"{ASSETS_DIR}/face_{_next_id}.png")):
+            _next_id += 1
+        new_id = _next_id
+        _next_id += 1
+    return new_id
+
+
+def save_face_image(face_image):
+    """ Save a face crop to saved_faces/ and assets/; returns the assets path """
+    # 确保两个目录都存在
+    os.makedirs(SAVED_DIR, exist_ok=True)
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+
+    new_id = _allocate_id()
+    save_path = f"{SAVED_DIR}/face_{new_id}.png"
+    asset_path = f"{ASSETS_DIR}/face_{new_id}.png"
+
+    cv2.imwrite(save_path, face_image)  # 保存到saved_faces
+    cv2.imwrite(asset_path, face_image)  # 保存到assets
+
+    return asset_path  # 返回assets路径用于显示
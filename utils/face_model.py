@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+import traceback
+
+import numpy as np
+
+from utils.embedding_codec import normalize
+
+# Lightweight insightface model pack; FACE_MODEL=buffalo_s_int8 loads the pack built by Quantize.py
+MODEL_NAME = os.environ.get("FACE_MODEL", "buffalo_s")
+MODEL_ROOT = "~/.insightface"  # insightface looks for packs in <root>/models/<name>
+CTX_ID = -1  # -1 means using CPU (set GPU index if available)
+# Only these insightface heads are loaded; landmark and gender/age heads are never used
+MODEL_MODULES = ["detection", "recognition"]
+PREVIEW_DET_SIZE = (160, 160)  # Detector input size for cheap preview loops
+INTRA_OP_THREADS = None  # ONNX Runtime threads per session (None = profile or runtime default)
+INTER_OP_THREADS = None  # ONNX Runtime inter-op threads (None = profile or runtime default)
+PROVIDERS = None  # ONNX Runtime execution providers (None = profile or insightface default)
+DET_SIZE = None  # Detector input size (None = profile or insightface's (640, 640))
+DEFAULT_DET_SIZE = (640, 640)
+PROFILE_PATH = "runtime_profile.json"  # Written by Calibrate.py, applied when the model loads
+
+# Shared model state; the model is loaded at most once per process
+_model = None
+_load_thread = None
+_ready_callbacks = []
+_lock = threading.Lock()
+
+
+def load_profile(path=None):
+    """Return the calibrated runtime profile, or {} if there is none"""
+    path = path or PROFILE_PATH
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Ignoring runtime profile {path}: {e}")
+        return {}
+
+
+def model_dir(name=None):
+    """Directory of an insightface model pack"""
+    return os.path.join(os.path.expanduser(MODEL_ROOT), "models", name or MODEL_NAME)
+
+
+def _create_model(profile=None, name=None):
+    """Build the FaceAnalysis model; explicit module settings win over the profile"""
+    from insightface.app import FaceAnalysis  # Heavy import, deferred until needed
+
+    if profile is None:
+        profile = load_profile()
+    intra_op_threads = INTRA_OP_THREADS or profile.get("intra_op_threads")
+    inter_op_threads = INTER_OP_THREADS or profile.get("inter_op_threads")
+    providers = PROVIDERS or profile.get("providers")
+    det_size = tuple(DET_SIZE or profile.get("det_size") or DEFAULT_DET_SIZE)
+    ctx_id = profile.get("ctx_id", CTX_ID) if PROVIDERS is None else CTX_ID
+
+    model = FaceAnalysis(name=name or MODEL_NAME, root=MODEL_ROOT, allowed_modules=MODEL_MODULES)
+    if intra_op_threads or inter_op_threads or providers:
+        _configure_sessions(model, intra_op_threads, inter_op_threads, providers)
+    model.prepare(ctx_id=ctx_id, det_size=det_size)
+    return model
+
+
+def _configure_sessions(model, intra_op_threads=None, inter_op_threads=None, providers=None):
+    """Recreate every head's ONNX Runtime session with the given options.
+
+    FaceAnalysis does not forward session options to its models, so the
+    sessions are rebuilt from each model file instead.
+    """
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    if intra_op_threads:
+        options.intra_op_num_threads = intra_op_threads
+    if inter_op_threads:
+        options.inter_op_num_threads = inter_op_threads
+    for head in model.models.values():
+        head.session = onnxruntime.InferenceSession(
+            head.model_file, sess_options=options,
+            providers=providers or head.session.get_providers())
+
+
+def _load():
+    global _model, _load_thread
+    try:
+        model = _create_model()
+    except Exception:
+        traceback.print_exc()
+        with _lock:
+            _load_thread = None
+        return
+
+    with _lock:
+        _model = model
+        _load_thread = None
+        callbacks = list(_ready_callbacks)
+        _ready_callbacks.clear()
+    for callback in callbacks:
+        callback(model)
+
+
+def load_model_async():
+    """Start loading the shared model on a background thread (once)"""
+    global _load_thread
+    with _lock:
+        if _model is not None or _load_thread is not None:
+            return
+        _load_thread = threading.Thread(target=_load, daemon=True)
+        _load_thread.start()
+
+
+def is_model_ready():
+    return _model is not None
+
+
+def when_model_ready(callback):
+    """Call callback(model) once the shared model is loaded.
+
+    Runs immediately if it is already loaded, otherwise on the loader
+    thread; UI code should hop back to its own thread (e.g. Clock).
+    """
+    with _lock:
+        model = _model
+        if model is None:
+            _ready_callbacks.append(callback)
+    if model is not None:
+        callback(model)
+
+
+def get_model():
+    """Return the shared model, loading it synchronously if necessary"""
+    load_model_async()
+    thread = _load_thread
+    if thread is not None:
+        thread.join()
+    if _model is None:
+        raise RuntimeError(f"Failed to load face model '{MODEL_NAME}'")
+    return _model
+
+
+def worker_threads(workers):
+    """ONNX Runtime threads per pool worker so the workers don't oversubscribe cores"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def init_worker(threads_per_worker):
+    """Pool initializer: load this worker process's own model copy"""
+    global INTRA_OP_THREADS
+    INTRA_OP_THREADS = threads_per_worker
+    get_model()
+
+
+def detect_faces(model, frame, input_size=None, max_num=0):
+    """Run only the detector of a FaceAnalysis model.
+
+    ``input_size`` overrides the detector resolution, e.g. PREVIEW_DET_SIZE
+    for a fast preview. Returns (bboxes, kpss): bboxes is (n, 5) with
+    x1, y1, x2, y2, score and kpss is (n, 5, 2) facial keypoints (or None
+    if the detector has none).
+    """
+    return model.det_model.detect(frame, input_size=input_size, max_num=max_num, metric="default")
+
+
+def analyze_faces(model, frame, stages=("recognition",), input_size=None, max_num=0):
+    """Detect faces and run only the selected heads on them.
+
+    ``stages`` names the insightface heads to run after detection (any of
+    the loaded MODEL_MODULES besides "detection"); recognition is batched
+    across faces. Returns insightface Face objects like FaceAnalysis.get().
+    """
+    from insightface.app.common import Face
+
+    bboxes, kpss = detect_faces(model, frame, input_size=input_size, max_num=max_num)
+    faces = [Face(bbox=bboxes[i, :4], kps=None if kpss is None else kpss[i], det_score=bboxes[i, 4])
+             for i in range(bboxes.shape[0])]
+
+    for stage in stages:
+        if stage == "recognition" and kpss is not None:
+            for face, embedding in zip(faces, embed_faces(model, frame, kpss)):
+                face.embedding = embedding
+        elif stage != "detection":
+            for face in faces:
+                model.models[stage].get(frame, face)
+    return faces
+
+
+def embed_faces(model, frame, kpss):
+    """Run only the ArcFace recognizer on already detected faces.
+
+    All faces are aligned from their keypoints and embedded in a single
+    batched inference; returns an (n, 512) matrix of normalized embeddings.
+    """
+    from insightface.utils import face_align
+
+    recognizer = model.models["recognition"]
+    if len(kpss) == 0:
+        return np.empty((0, 512), dtype=np.float32)
+    crops = [face_align.norm_crop(frame, landmark=kps, image_size=recognizer.input_size[0])
+             for kps in kpss]
+    return normalize(recognizer.get_feat(crops))
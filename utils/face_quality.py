@@ -0,0 +1,105 @@
+import heapq
+import math
+
+import numpy as np
+
+from utils import face_images
+
+MIN_DET_SCORE = 0.6  # Detector confidence below this is rejected
+MIN_FACE_SIZE = 80  # Shorter bbox side in pixels
+MIN_SHARPNESS = 40.0  # Laplacian variance of the face crop
+MAX_YAW = 0.35  # Nose offset from the eye midpoint, in inter-eye distances
+MAX_PITCH = 0.25  # Nose height offset between the eye and mouth lines (0 = centred)
+MAX_ROLL = 25.0  # Degrees of head tilt
+SHARPNESS_REF = 250.0  # Crops at least this sharp score full marks
+SIZE_REF = 160  # Faces at least this large score full marks
+PITCH_CENTER = 0.55  # Typical nose position between the eye and mouth lines
+
+
+def pose_from_kps(kps):
+    """Rough (yaw, pitch, roll) from the 5 detector keypoints.
+
+    Keypoints are left eye, right eye, nose, left and right mouth corner.
+    yaw and pitch are dimensionless offsets (0 = frontal), roll is in degrees.
+    """
+    kps = np.asarray(kps, dtype=np.float32)
+    eye_mid = (kps[0] + kps[1]) / 2
+    mouth_mid = (kps[3] + kps[4]) / 2
+    eye_axis = kps[1] - kps[0]
+    eye_dist = max(float(np.linalg.norm(eye_axis)), 1e-6)
+    x_axis = eye_axis / eye_dist
+    y_axis = np.array([-x_axis[1], x_axis[0]])  # Perpendicular, pointing down the face
+
+    nose = kps[2] - eye_mid
+    yaw = float(nose @ x_axis) / eye_dist
+    face_height = max(float((mouth_mid - eye_mid) @ y_axis), 1e-6)
+    pitch = float(nose @ y_axis) / face_height - PITCH_CENTER
+    roll = math.degrees(math.atan2(eye_axis[1], eye_axis[0]))
+    return yaw, pitch, roll
+
+
+def assess(frame, bbox, kps, det_score):
+    """Score one detected face for enrollment.
+
+    Returns (score, crop, reason): score is in [0, 1], crop is the face
+    crop and reason names the first failed check (None if accepted). Cheap
+    checks run first so rejected frames are never cropped.
+    """
+    if det_score < MIN_DET_SCORE:
+        return 0.0, None, "low confidence"
+    size = min(bbox[2] - bbox[0], bbox[3] - bbox[1])
+    if size < MIN_FACE_SIZE:
+        return 0.0, None, "too small"
+    if kps is not None:
+        yaw, pitch, roll = pose_from_kps(kps)
+        if abs(yaw) > MAX_YAW or abs(pitch) > MAX_PITCH or abs(roll) > MAX_ROLL:
+            return 0.0, None, "off angle"
+        frontal = 1.0 - 0.5 * max(abs(yaw) / MAX_YAW, abs(pitch) / MAX_PITCH, abs(roll) / MAX_ROLL)
+    else:
+        frontal = 0.5
+
+    crop = face_images.crop_face(frame, bbox)
+    sharp = face_images.sharpness(crop)
+    if sharp < MIN_SHARPNESS:
+        return 0.0, None, "blurry"
+
+    score = (float(det_score) * frontal
+             * min(1.0, sharp / SHARPNESS_REF)
+             * min(1.0, size / SIZE_REF))
+    return score, crop, None
+
+
+class BestSamples:
+    """Fixed-size min-heap of the highest scoring capture samples.
+
+    Only embeddings are kept per sample; the single best crop is tracked
+    separately, so memory stays flat however long capture runs.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._heap = []  # (score, sequence, embedding)
+        self._sequence = 0
+        self.best_score = -1.0
+        self.best_crop = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, score, embedding, crop):
+        self._sequence += 1
+        item = (score, self._sequence, embedding)
+        if len(self._heap) < self.capacity:
+            heapq.heappush(self._heap, item)
+        elif score > self._heap[0][0]:
+            heapq.heapreplace(self._heap, item)
+        if score > self.best_score:
+            self.best_score = score
+            self.best_crop = crop
+
+    def count_above(self, score):
+        return sum(1 for item in self._heap if item[0] >= score)
+
+    def embeddings(self):
+        """Kept embeddings, best first"""
+        return [item[2] for item in sorted(self._heap, reverse=True)]
@@ -0,0 +1,49 @@
+import numpy as np
+
+from utils.embedding_codec import normalize
+
+TEMPLATE_COUNT = 5  # Extra templates kept per person at enrollment
+KMEANS_ITERATIONS = 10
+
+
+def most_diverse(embeddings, k=TEMPLATE_COUNT):
+    """Pick k embeddings by farthest-point sampling.
+
+    Starts from the capture closest to the mean (the most typical one) and
+    then repeatedly adds the capture least similar to everything picked.
+    """
+    vectors = normalize(embeddings)
+    if len(vectors) <= k:
+        return vectors
+    picked = [int(np.argmax(vectors @ vectors.mean(axis=0)))]
+    closest = vectors @ vectors[picked[0]]  # Similarity to the nearest picked template
+    while len(picked) < k:
+        candidate = int(np.argmin(closest))
+        picked.append(candidate)
+        closest = np.maximum(closest, vectors @ vectors[candidate])
+    return vectors[picked]
+
+
+def kmeans_centroids(embeddings, k=TEMPLATE_COUNT, iterations=KMEANS_ITERATIONS):
+    """Cluster the embeddings into k groups and return the normalized centroids"""
+    vectors = normalize(embeddings)
+    if len(vectors) <= k:
+        return vectors
+    centroids = most_diverse(vectors, k)  # Deterministic, well spread start
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(k):
+            members = vectors[assignment == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = normalize(centroids)
+    return centroids
+
+
+def select_templates(embeddings, k=TEMPLATE_COUNT, method="diverse"):
+    """Reduce a capture set to k templates ("diverse" or "kmeans")"""
+    if len(embeddings) == 0:
+        return np.empty((0, 0), dtype=np.float32)
+    if method == "kmeans":
+        return kmeans_centroids(embeddings, k)
+    return most_diverse(embeddings, k)
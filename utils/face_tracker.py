@@ -0,0 +1,160 @@
+import cv2
+import numpy as np
+
+from utils.face_model import detect_faces, embed_faces
+
+DETECT_EVERY = 5  # Run the detector every N frames
+REVERIFY_EVERY = 30  # Re-run recognition on an existing track every N frames
+IOU_THRESHOLD = 0.3  # Minimum IoU to associate a detection with a track
+MAX_MISSES = 2  # Detection rounds a track may go unmatched before it is dropped
+MOTION_THRESHOLD = 0.05  # Fraction of changed pixels that forces a detection
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between two (n, 4) arrays of x1, y1, x2, y2 boxes"""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    a = boxes_a[:, None, :4]
+    b = boxes_b[None, :, :4]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+
+class Track:
+    """A face followed across frames together with its last recognition result"""
+
+    def __init__(self, track_id, bbox, kps, det_score):
+        self.track_id = track_id
+        self.bbox = np.asarray(bbox, dtype=np.float32)
+        self.kps = None if kps is None else np.asarray(kps, dtype=np.float32)
+        self.det_score = float(det_score)
+        self.matches = [("Unknown", 0.0)]
+        self.last_verified = None  # Frame index of the last recognition
+        self.misses = 0
+
+    def shift(self, dx, dy):
+        self.bbox += (dx, dy, dx, dy)
+        if self.kps is not None:
+            self.kps += (dx, dy)
+
+
+class FaceTracker:
+    """Detect every N frames (or on motion) and follow faces in between.
+
+    Boxes are carried forward with sparse optical flow between detections
+    and associated to new detections by IoU. Recognition runs once when a
+    track appears and then only every ``reverify_every`` frames, batched
+    across all tracks that need it.
+    """
+
+    def __init__(self, model, match_batch, detect_every=DETECT_EVERY, reverify_every=REVERIFY_EVERY):
+        self.model = model
+        self.match_batch = match_batch
+        self.detect_every = detect_every
+        self.reverify_every = reverify_every
+        self.tracks = []
+        self.frame_index = 0
+        self.next_track_id = 1
+        self.detections = 0
+        self.recognitions = 0
+        self._prev_gray = None
+        self._motion_ref = None
+
+    def update(self, frame):
+        """Process one frame and return the current list of tracks"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        detected = self._should_detect(gray)
+        if detected:
+            self._detect(frame, gray)
+        else:
+            self._propagate(gray)
+
+        self._recognize(frame, detected)
+        self._prev_gray = gray
+        self.frame_index += 1
+        return self.tracks
+
+    def _should_detect(self, gray):
+        if self._prev_gray is None or self.frame_index % self.detect_every == 0:
+            return True
+        small = cv2.resize(gray, (64, 48), interpolation=cv2.INTER_AREA)
+        changed = np.mean(cv2.absdiff(small, self._motion_ref) > 25)
+        return changed > MOTION_THRESHOLD
+
+    def _detect(self, frame, gray):
+        self.detections += 1
+        self._motion_ref = cv2.resize(gray, (64, 48), interpolation=cv2.INTER_AREA)
+        bboxes, kpss = detect_faces(self.model, frame)
+
+        ious = iou_matrix(np.array([t.bbox for t in self.tracks]).reshape(-1, 4), bboxes)
+        matched_tracks, matched_dets = set(), set()
+        # Greedy association, best IoU first
+        for flat in np.argsort(-ious, axis=None):
+            t, d = np.unravel_index(flat, ious.shape)
+            if ious[t, d] < IOU_THRESHOLD:
+                break
+            if t in matched_tracks or d in matched_dets:
+                continue
+            track = self.tracks[t]
+            track.bbox = bboxes[d, :4].astype(np.float32)
+            track.kps = None if kpss is None else kpss[d].astype(np.float32)
+            track.det_score = float(bboxes[d, 4])
+            track.misses = 0
+            matched_tracks.add(t)
+            matched_dets.add(d)
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= MAX_MISSES]
+
+        for d in range(len(bboxes)):
+            if d not in matched_dets:
+                kps = None if kpss is None else kpss[d]
+                self.tracks.append(Track(self.next_track_id, bboxes[d, :4], kps, bboxes[d, 4]))
+                self.next_track_id += 1
+
+    def _propagate(self, gray):
+        """Shift each box by the median optical flow of corners inside it"""
+        height, width = gray.shape
+        for track in self.tracks:
+            x1, y1, x2, y2 = track.bbox.astype(int)
+            x1, y1 = max(x1, 0), max(y1, 0)
+            x2, y2 = min(x2, width), min(y2, height)
+            if x2 - x1 < 8 or y2 - y1 < 8:
+                continue
+            mask = np.zeros_like(gray)
+            mask[y1:y2, x1:x2] = 255
+            points = cv2.goodFeaturesToTrack(self._prev_gray, maxCorners=30, qualityLevel=0.01,
+                                             minDistance=5, mask=mask)
+            if points is None:
+                continue
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, points, None)
+            good = status.reshape(-1) == 1
+            if good.sum() < 3:
+                continue
+            dx, dy = np.median((moved - points).reshape(-1, 2)[good], axis=0)
+            track.shift(dx, dy)
+
+    def _recognize(self, frame, detected):
+        """Embed and match new tracks, and stale ones on detection frames, in one batch"""
+        pending = []
+        for track in self.tracks:
+            if track.kps is None:
+                continue
+            if track.last_verified is None:
+                pending.append(track)
+            elif detected and track.misses == 0 and self.frame_index - track.last_verified >= self.reverify_every:
+                pending.append(track)  # Re-verify with fresh keypoints
+        if not pending:
+            return
+        self.recognitions += len(pending)
+        embeddings = embed_faces(self.model, frame, [track.kps for track in pending])
+        for track, matches in zip(pending, self.match_batch(embeddings)):
+            track.matches = matches
+            track.last_verified = self.frame_index
@@ -0,0 +1,157 @@
+import threading
+import time
+import traceback
+
+import cv2
+
+from utils.perf_metrics import metrics
+
+FAILED_AFTER = 2.0  # Seconds of consecutive failed reads before a source counts as ended
+
+
+def open_source(source):
+    """Open a capture; digits mean a local camera index, anything else is a file or stream URL"""
+    return cv2.VideoCapture(int(source) if source.isdigit() else source)
+
+
+class LatestFrameCapture:
+    """Reads a cv2.VideoCapture on a background thread, keeping only the newest frame.
+
+    Older frames are overwritten rather than queued, so consumers always
+    see the most recent image and never fall behind the camera.
+
+    ``failed`` is set once reads have failed for FAILED_AFTER seconds in a
+    row (the file ended or the camera died) and cleared by the next good
+    frame, so a warm-up or network hiccup does not end a live stream.
+    """
+
+    def __init__(self, capture, name="pipeline"):
+        self.capture = capture
+        self.name = name
+        self.frame_id = 0
+        self.frame = None
+        self.failed = False
+        self._failing_since = None  # Time of the first failed read in the current run
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def isOpened(self):
+        return self.capture is not None and self.capture.isOpened()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def _run(self):
+        stage = f"{self.name}.capture"
+        while self._running:
+            with metrics.timer(stage):
+                ret, frame = self.capture.read()
+            if not ret:
+                now = time.monotonic()
+                if self._failing_since is None:
+                    self._failing_since = now
+                elif now - self._failing_since >= FAILED_AFTER:
+                    self.failed = True
+                time.sleep(0.01)
+                continue
+            self._failing_since = None
+            self.failed = False
+            with self._cond:
+                self.frame_id += 1
+                self.frame = frame
+                self._cond.notify_all()
+
+    def read(self):
+        """Return (frame_id, frame) of the newest frame, or (0, None)"""
+        with self._cond:
+            return self.frame_id, self.frame
+
+    def wait_newer(self, frame_id, timeout=0.5):
+        """Block until a frame newer than frame_id arrives; return it or (frame_id, None)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.frame_id > frame_id or not self._running, timeout)
+            if self.frame_id > frame_id:
+                return self.frame_id, self.frame
+            return frame_id, None
+
+
+class FramePipeline:
+    """Capture thread -> inference worker -> latest result for the UI thread.
+
+    ``process(frame)`` runs on the worker thread whenever it is free and
+    always gets the newest captured frame; frames that arrive while it is
+    busy are dropped. The UI thread polls ``latest()`` and only renders.
+    """
+
+    def __init__(self, capture, process, name="pipeline"):
+        self.source = LatestFrameCapture(capture, name)
+        self.process = process
+        self.name = name
+        self.result_id = 0
+        self.result = None
+        self.processed = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def isOpened(self):
+        return self.source.isOpened()
+
+    def start(self):
+        self._running = True
+        self.source.start()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop both threads and release the camera"""
+        self._running = False
+        self.source.stop()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+        if self.source.capture is not None:
+            self.source.capture.release()
+
+    def _run(self):
+        last_id = 0
+        while self._running:
+            frame_id, frame = self.source.wait_newer(last_id)
+            if frame is None:
+                continue
+            if last_id:
+                self.dropped += frame_id - last_id - 1
+                metrics.count(f"{self.name}.dropped_frames", frame_id - last_id - 1)
+            last_id = frame_id
+            try:
+                with metrics.timer(f"{self.name}.inference"):
+                    result = self.process(frame)
+            except Exception:
+                traceback.print_exc()
+                continue
+            metrics.tick(f"{self.name}.inference_fps")
+            with self._lock:
+                self.result_id = frame_id
+                self.result = result
+                self.processed += 1
+
+    def latest_frame(self):
+        """Return (frame_id, frame) of the newest raw camera frame"""
+        return self.source.read()
+
+    def latest(self):
+        """Return (frame_id, result) of the newest processed frame, or (0, None)"""
+        with self._lock:
+            return self.result_id, self.result
@@ -0,0 +1,187 @@
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Set FACE_PERF=1 to collect metrics; when off every hook is a cheap no-op
+ENABLED = os.environ.get("FACE_PERF", "") == "1"
+METRICS_PATH = os.environ.get("FACE_PERF_FILE", "metrics.prom")  # Prometheus text file
+WRITE_INTERVAL = 10.0  # Seconds between metrics file writes
+WINDOW = 512  # Samples kept per stage for rolling percentiles
+FPS_WINDOW = 2.0  # Seconds of ticks used to compute fps
+
+
+class _NullTimer:
+    """Shared do-nothing context manager returned while metrics are disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class PerfMetrics:
+    """Rolling per-stage latencies, fps meters and event counters.
+
+    Stages are plain dotted names such as "recognition.detect". Latency
+    percentiles are computed over the last WINDOW samples.
+    """
+
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._samples = {}  # stage -> deque of seconds
+        self._totals = {}  # stage -> [count, sum]
+        self._ticks = {}  # name -> deque of timestamps
+        self._counters = {}  # name -> int
+        self._writer = None
+
+    def timer(self, stage):
+        """Context manager timing a block as one sample of stage"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=WINDOW)
+                self._totals[stage] = [0, 0.0]
+            samples.append(seconds)
+            totals = self._totals[stage]
+            totals[0] += 1
+            totals[1] += seconds
+
+    def tick(self, name):
+        """Record one event of a rate meter (e.g. a rendered frame)"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            ticks = self._ticks.get(name)
+            if ticks is None:
+                ticks = self._ticks[name] = deque()
+            ticks.append(now)
+            while ticks and now - ticks[0] > FPS_WINDOW:
+                ticks.popleft()
+
+    def count(self, name, n=1):
+        """Increase an event counter (e.g. dropped frames)"""
+        if not self.enabled or not n:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def snapshot(self):
+        """Current metrics as {"stages": {...}, "fps": {...}, "counters": {...}}"""
+        now = time.perf_counter()
+        with self._lock:
+            samples = {stage: np.array(values) for stage, values in self._samples.items()}
+            totals = {stage: tuple(values) for stage, values in self._totals.items()}
+            ticks = {name: [t for t in values if now - t <= FPS_WINDOW] for name, values in self._ticks.items()}
+            counters = dict(self._counters)
+
+        stages = {}
+        for stage, values in samples.items():
+            p50, p95, p99 = np.percentile(values, [50, 95, 99]) if values.size else (0.0, 0.0, 0.0)
+            stages[stage] = {"p50": p50, "p95": p95, "p99": p99,
+                             "count": totals[stage][0], "sum": totals[stage][1]}
+        fps = {name: len(values) / FPS_WINDOW for name, values in ticks.items()}
+        return {"stages": stages, "fps": fps, "counters": counters}
+
+    def format_overlay(self, prefix=""):
+        """Short multi-line text for an on-screen overlay (prefix may be a tuple)"""
+        snap = self.snapshot()
+        lines = [f"{name}: {value:.1f} fps" for name, value in sorted(snap["fps"].items())
+                 if name.startswith(prefix)]
+        lines += [f"{stage}: p50 {s['p50'] * 1000:.1f} / p95 {s['p95'] * 1000:.1f} ms"
+                  for stage, s in sorted(snap["stages"].items()) if stage.startswith(prefix)]
+        lines += [f"{name}: {value}" for name, value in sorted(snap["counters"].items())
+                  if name.startswith(prefix)]
+        return "\n".join(lines)
+
+    def prometheus_text(self):
+        """Metrics in the Prometheus text exposition format"""
+        snap = self.snapshot()
+        lines = ["# TYPE face_stage_latency_seconds summary"]
+        for stage, s in sorted(snap["stages"].items()):
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+                lines.append(f'face_stage_latency_seconds{{stage="{stage}",quantile="{quantile}"}} {s[key]:.6f}')
+            lines.append(f'face_stage_latency_seconds_sum{{stage="{stage}"}} {s["sum"]:.6f}')
+            lines.append(f'face_stage_latency_seconds_count{{stage="{stage}"}} {s["count"]}')
+        lines.append("# TYPE face_fps gauge")
+        for name, value in sorted(snap["fps"].items()):
+            lines.append(f'face_fps{{name="{name}"}} {value:.2f}')
+        lines.append("# TYPE face_events_total counter")
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f'face_events_total{{name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path=None):
+        """Atomically (re)write the Prometheus metrics file"""
+        path = path or METRICS_PATH
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(path + ".tmp", path)
+
+    def start_writer(self, path=None, interval=WRITE_INTERVAL):
+        """Write the metrics file every interval seconds on a daemon thread"""
+        if not self.enabled or self._writer is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write_file(path)
+                except OSError as e:
+                    print(f"Failed to write metrics file: {e}")
+
+        self._writer = threading.Thread(target=run, daemon=True)
+        self._writer.start()
+
+
+# Process-wide registry used by the screens, pipeline and database layer
+metrics = PerfMetrics()
+
+
+def timed(stage):
+    """Decorator timing every call of a function as a sample of stage"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
@@ -0,0 +1,24 @@
+from kivy.clock import Clock
+from kivy.metrics import dp
+from kivymd.uix.label import MDLabel
+
+from utils.perf_metrics import metrics
+
+OVERLAY_INTERVAL = 1.0  # Seconds between overlay refreshes
+
+
+def add_perf_overlay(layout, prefixes):
+    """Add a live performance label to layout when metrics are enabled.
+
+    Only metrics whose names start with one of prefixes are shown.
+    Returns the label, or None when metrics are disabled.
+    """
+    if not metrics.enabled:
+        return None
+
+    label = MDLabel(text="", halign="left", font_style="Caption", theme_text_color="Hint",
+                    size_hint_y=None, height=dp(140))
+    layout.add_widget(label)
+    Clock.schedule_interval(lambda dt: setattr(label, "text", metrics.format_overlay(tuple(prefixes))),
+                            OVERLAY_INTERVAL)
+    return label
@@ -0,0 +1,69 @@
+import json
+import time
+import urllib.request
+
+import cv2
+import numpy as np
+
+REQUEST_TIMEOUT = 2.0  # Seconds before a frame is given up on
+RETRY_INTERVAL = 5.0  # Seconds to wait before retrying an unreachable server
+JPEG_QUALITY = 85
+
+
+def recognize_remote(url, frame, timeout=REQUEST_TIMEOUT):
+    """Send a frame to RecognitionServer; returns its list of face dicts.
+
+    Raises OSError (including URLError and timeouts) if the server is unreachable.
+    """
+    return _post_image(url.rstrip("/") + "/recognize", frame, timeout)
+
+
+def recognize_crops_remote(url, crops, timeout=REQUEST_TIMEOUT):
+    """Send aligned face crops (e.g. 112x112 from face_align.norm_crop) to RecognitionServer.
+
+    Skips detection on the server; returns one face dict (without bbox) per crop.
+    """
+    if len(crops) == 0:
+        return []
+    return _post_image(url.rstrip("/") + "/recognize_crops", np.vstack(crops), timeout)
+
+
+def _post_image(url, image, timeout):
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not ok:
+        raise ValueError("Failed to encode frame")
+    request = urllib.request.Request(url, data=encoded.tobytes(), headers={"Content-Type": "image/jpeg"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)["faces"]
+
+
+class RecognitionClient:
+    """recognize_remote() that backs off while the server is unreachable.
+
+    After a failure, frames are not sent for RETRY_INTERVAL seconds and
+    only the first error of an outage is printed.
+    """
+
+    def __init__(self, url, timeout=REQUEST_TIMEOUT, retry_interval=RETRY_INTERVAL):
+        self.url = url
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._retry_at = 0.0
+        self._failing = False
+
+    def recognize(self, frame):
+        """Return the server's face dicts, or None while it is unreachable"""
+        if time.monotonic() < self._retry_at:
+            return None
+        try:
+            faces = recognize_remote(self.url, frame, self.timeout)
+        except (OSError, ValueError) as e:
+            if not self._failing:
+                print(f"Recognition server error: {e} (retrying every {self.retry_interval:g} s)")
+            self._failing = True
+            self._retry_at = time.monotonic() + self.retry_interval
+            return None
+        if self._failing:
+            print("Recognition server reachable again")
+            self._failing = False
+        return faces
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+
+THUMBNAIL_DIR = "thumbnails"  # On-disk cache of small list avatars
+THUMBNAIL_SIZE = (96, 96)
+MEMORY_CAPACITY = 256  # Decoded thumbnails kept in memory
+DEFAULT_IMAGE = "assets/default_face.png"
+
+
+def thumbnail_path(image_path):
+    """Disk cache path of an image's thumbnail (image paths are unique per face)"""
+    key = hashlib.sha1(os.path.abspath(image_path).encode("utf-8")).hexdigest()
+    return os.path.join(THUMBNAIL_DIR, key + ".png")
+
+
+def make_thumbnail(image_path, size=THUMBNAIL_SIZE):
+    """Return the path of an up-to-date thumbnail, creating it if needed.
+
+    Returns None if the source image is missing or unreadable.
+    """
+    if not image_path or not os.path.exists(image_path):
+        return None
+    path = thumbnail_path(image_path)
+    try:
+        if os.path.getmtime(path) >= os.path.getmtime(image_path):
+            return path
+    except OSError:
+        pass  # Not cached yet
+
+    image = cv2.imread(image_path)
+    if image is None:
+        return None
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    cv2.imwrite(path, cv2.resize(image, size, interpolation=cv2.INTER_AREA))
+    return path
+
+
+class ThumbnailCache:
+    """In-memory LRU of decoded thumbnails on top of the disk cache.
+
+    ``loader(path)`` turns a thumbnail file into whatever the UI displays
+    (e.g. a Kivy texture). Missing images fall back to DEFAULT_IMAGE.
+    """
+
+    def __init__(self, loader, capacity=MEMORY_CAPACITY, size=THUMBNAIL_SIZE):
+        self.loader = loader
+        self.capacity = capacity
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, image_path):
+        with self._lock:
+            item = self._items.get(image_path)
+            if item is not None:
+                self._items.move_to_end(image_path)
+                return item
+
+        item = self.loader(make_thumbnail(image_path, self.size) or DEFAULT_IMAGE)
+        with self._lock:
+            self._items[image_path] = item
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+        return item
+
+    def discard(self, image_path):
+        """Forget an image (e.g. its face was deleted) in memory and on disk"""
+        with self._lock:
+            self._items.pop(image_path, None)
+        if image_path:
+            try:
+                os.remove(thumbnail_path(image_path))
+            except OSError:
+                pass
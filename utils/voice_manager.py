@@ -1,12 +1,52 @@
 from kivy.utils import platform
-from threading import Thread
+from threading import Thread, Lock
+import hashlib
+import itertools
+import os
+import queue
 import time
+from utils.perf_metrics import metrics
+
+# Queue priorities (lower is spoken first)
+PRIORITY_ALERT = 0
+PRIORITY_GREETING = 1
+PRIORITY_INFO = 2
+PRIORITY_RENDER = 3  # Background pre-rendering of cached phrases
+
+GREETING_INTERVAL = 60.0  # Seconds before greeting the same person again
+ALERT_INTERVAL = 10.0  # Seconds between repeated unknown-face alerts
+MAX_QUEUE_AGE = 10.0  # Announcements older than this are dropped unspoken
+VOICE_CACHE_DIR = "voice_cache"  # Pre-rendered phrases (.wav)
+
+
+def greeting_text(name, relation):
+    """欢迎语（识别成功时播放，录入时预先合成）"""
+    return f"Welcome {name}! I recognize you as my {relation}."
+
+
+def cache_path(text):
+    """Path of the pre-rendered audio for text"""
+    return os.path.join(VOICE_CACHE_DIR, hashlib.sha1(text.encode("utf-8")).hexdigest() + ".wav")
+
 
 class VoiceManager:
+    """单一后台线程播报语音：优先级队列、去重、按身份限频，并缓存预合成音频"""
+
     def __init__(self):
-        self.is_speaking = False
-        self.tts = None
-        
+        self.tts = None  # 在工作线程中初始化（pyttsx3需在同一线程使用）
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._lock = Lock()
+        self._queued = set()  # Texts waiting in the queue (dedup)
+        self._last_spoken = {}  # Rate-limit key -> time of the last announcement
+        self._worker = Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    @property
+    def is_speaking(self):
+        return not self._queue.empty()
+
+    def _init_tts(self):
         # 根据平台初始化TTS
         if platform == 'android':
             from android.tts import TTS
@@ -17,51 +57,129 @@ class VoiceManager:
             self.tts = pyttsx3.init()
             self.tts.setProperty('rate', 150)
             self.tts.setProperty('volume', 0.9)
-    
-    def speak(self, text):
-        """非阻塞的语音播报"""
-        if not self.is_speaking:
-            self.is_speaking = True
-            Thread(target=self._speak_thread, args=(text,), daemon=True).start()
-    
-    def _speak_thread(self, text):
-        """在独立线程中进行语音播报"""
+
+    def speak(self, text, priority=PRIORITY_INFO, key=None, interval=0.0):
+        """非阻塞的语音播报
+
+        Messages are queued by priority; a text already waiting is not queued
+        twice, and announcements sharing ``key`` are spoken at most once per
+        ``interval`` seconds. Returns False if the message was dropped.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if text in self._queued:
+                return False
+            if key is not None:
+                last = self._last_spoken.get(key)
+                if last is not None and now - last < interval:
+                    return False
+                self._last_spoken[key] = now
+            self._queued.add(text)
+        self._queue.put((priority, next(self._sequence), now, text))
+        return True
+
+    def prerender(self, text):
+        """Synthesize text to the audio cache in the background (desktop only)"""
+        if platform == 'android' or os.path.exists(cache_path(text)):
+            return
+        self._queue.put((PRIORITY_RENDER, next(self._sequence), None, text))
+
+    def _run(self):
+        """TTS工作线程：依次处理队列中的播报和预合成任务"""
+        try:
+            self._init_tts()
+        except Exception as e:
+            print(f"Failed to initialize TTS: {e}")
+        while True:
+            priority, _, queued_at, text = self._queue.get()
+            if priority != PRIORITY_RENDER:
+                with self._lock:
+                    self._queued.discard(text)
+            if self.tts is None:
+                continue
+            try:
+                if priority == PRIORITY_RENDER:
+                    self._render(text)
+                    continue
+                if time.monotonic() - queued_at > MAX_QUEUE_AGE:
+                    metrics.count("voice.dropped_stale")
+                    continue  # 已过时的提示不再播报
+                with metrics.timer("voice.speak"):
+                    if not self._play_cached(text):
+                        self._say(text)
+            except Exception as e:
+                print(f"语音播报出错: {e}")
+
+    def _say(self, text):
+        if platform == 'android':
+            self.tts.speak(text)
+        else:
+            self.tts.say(text)
+            self.tts.runAndWait()
+
+    def _render(self, text):
+        path = cache_path(text)
+        if os.path.exists(path):
+            return
+        os.makedirs(VOICE_CACHE_DIR, exist_ok=True)
+        with metrics.timer("voice.render"):
+            self.tts.save_to_file(text, path + ".tmp.wav")
+            self.tts.runAndWait()
+        if os.path.exists(path + ".tmp.wav"):
+            os.replace(path + ".tmp.wav", path)
+
+    def _play_cached(self, text):
+        """Play the pre-rendered audio of text; False if there is none"""
+        path = cache_path(text)
+        if platform == 'android' or not os.path.exists(path):
+            return False
         try:
-            if platform == 'android':
-                self.tts.speak(text)
-            else:
-                self.tts.say(text)
-                self.tts.runAndWait()
-        finally:
-            self.is_speaking = False
-            time.sleep(0.1)  # 防止连续播放时的冲突
-    
+            import winsound
+            winsound.PlaySound(path, winsound.SND_FILENAME)
+            return True
+        except ImportError:
+            pass
+        from kivy.core.audio import SoundLoader
+        sound = SoundLoader.load(path)
+        if sound is None:
+            return False
+        sound.play()
+        time.sleep(sound.length or 0)  # 等待播放结束，避免与下一条重叠
+        return True
+
     def verification_success(self, name, relation):
         """验证通过消息"""
-        success_text = f"Welcome {name}! I recognize you as my {relation}."
-        self.speak(success_text)
-    
+        success_text = greeting_text(name, relation)
+        self.speak(success_text, PRIORITY_GREETING, key=("greeting", name), interval=GREETING_INTERVAL)
+
+    def prerender_greeting(self, name, relation):
+        """录入时预先合成欢迎语，识别时可立即播放"""
+        self.prerender(greeting_text(name, relation))
+
     def alert_message(self, message):
         """警告消息"""
         alert_text = "This face is not in your database. Please carefully verify their identity."
-        self.speak(alert_text)
-    
+        self.speak(alert_text, PRIORITY_ALERT, key="alert", interval=ALERT_INTERVAL)
+
     def stop(self):
-        """停止语音播报"""
-        if platform == 'android':
-            if self.tts:
-                self.tts.stop()
-        else:
-            if self.tts:
+        """停止语音播报并清空队列"""
+        with self._lock:
+            while True:
                 try:
-                    self.tts.stop()
-                except:
-                    pass 
-    
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._queued.clear()
+        if self.tts:
+            try:
+                self.tts.stop()
+            except Exception:
+                pass
+
     def face_detected(self):
         """检测到人脸时的提示"""
         prompt_text = "Please click the button to start adding this person."
-        self.speak(prompt_text) 
+        self.speak(prompt_text)
 
     def no_face_detected(self):
         """未检测到人脸时的提示"""